@@ -0,0 +1,34 @@
+import time
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def run_view(view, request, *args, **kwargs):
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            started = time.perf_counter()
+            response.render()
+            if hasattr(request, 'render_duration'):
+                request.render_duration += time.perf_counter() - started
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    read = sync_to_async(partial(run_view, view), thread_sensitive=False)
+    write = sync_to_async(partial(run_view, view), thread_sensitive=True)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await read(request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    return async_view
@@ -0,0 +1,72 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+from foodgram.cache import get_version
+
+AUTH_VERSION = 'auth:{}'
+
+
+class TokenCache:
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[3] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        user, token, version, _ = entry
+        if get_version(AUTH_VERSION.format(user.pk)) != version:
+            self.delete(key)
+            return None
+        return copy.copy(user), copy.copy(token)
+
+    def set(self, key, user, token, version):
+        expires = time.monotonic() + settings.TOKEN_CACHE_TIMEOUT
+        with self.lock:
+            self.entries[key] = (user, token, version, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_user(self, user_id):
+        with self.lock:
+            for key in [
+                key for key, (user, *_) in self.entries.items()
+                if user.pk == user_id
+            ]:
+                del self.entries[key]
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        model = self.get_model()
+        user_id = model.objects.filter(key=key).values_list(
+            'user_id', flat=True
+        ).first()
+        version = get_version(AUTH_VERSION.format(user_id))
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token, version)
+        return copy.copy(user), copy.copy(token)
@@ -0,0 +1,51 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from foodgram.cache import get_versions
+from .replicas import primary_reads
+
+
+class AnonymousResponseCacheMixin:
+    response_cache_params = ()
+    response_cache_list_params = ()
+
+    def get_response_cache_key(self, request, version_names):
+        if (
+            not settings.RESPONSE_CACHE_ENABLED
+            or request.user.is_authenticated
+            or any(
+                param not in self.response_cache_params
+                for param in request.query_params
+            )
+        ):
+            return None
+        params = []
+        for param in sorted(request.query_params):
+            values = request.query_params.getlist(param)
+            if param in self.response_cache_list_params:
+                params.append((param, sorted(set(values))))
+            else:
+                params.append((param, values[-1]))
+        versions = sorted(get_versions(version_names).items())
+        digest = hashlib.sha1(repr(
+            (request.get_host(), request.path, params, versions)
+        ).encode()).hexdigest()
+        return f'response:{digest}'
+
+    def cached_response(self, version_names, handler, request, *args,
+                        **kwargs):
+        key = self.get_response_cache_key(request, version_names)
+        if key is None:
+            return handler(request, *args, **kwargs)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+        with primary_reads():
+            response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+            response['X-Cache'] = 'MISS'
+        return response
@@ -1,19 +1,77 @@
+import re
+import threading
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+)
+from django.db import connection
+from django.db.models import (Case, Exists, IntegerField, OuterRef, Q, Value,
+                              When)
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
-from recipes.models import Recipe, Tag
+from foodgram.cache import get_version
+from recipes.models import FavoriteReceipe, Recipe, ShoppingCart, Tag
+from .replicas import primary_reads
+
+RECIPE_ORDERINGS = {
+    'new': ('-pub_date', '-id'),
+    'popular': ('-favorites_count', '-id'),
+    'in_carts': ('-in_carts_count', '-id'),
+}
+COUNTER_ORDERINGS = ('popular', 'in_carts')
+
+RECIPE_SEARCH_VECTOR = (
+    SearchVector('name', weight='A', config=settings.RECIPE_SEARCH_CONFIG)
+    + SearchVector('text', weight='B', config=settings.RECIPE_SEARCH_CONFIG)
+)
+
+
+class TagSlugs:
+
+    def __init__(self):
+        self.ids = {}
+        self.version = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        version = get_version('tags')
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    with primary_reads():
+                        self.ids = dict(
+                            Tag.objects.values_list('slug', 'id')
+                        )
+                    self.version = version
+        return self.ids
+
+
+tag_slugs = TagSlugs()
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_slugs.get()]
 
 
 class RecipeFilter(FilterSet):
 
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='tags_filter',
     )
     is_favorited = filters.BooleanFilter(method='is_favorited_filter')
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_filter'
     )
+    search = filters.CharFilter(method='search_filter')
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('new', 'Новые'),
+            ('popular', 'Популярные'),
+            ('in_carts', 'Чаще добавляют в покупки'),
+        ),
+        method='ordering_filter',
+    )
 
     class Meta:
         model = Recipe
@@ -22,21 +80,77 @@ class RecipeFilter(FilterSet):
             'author',
             'is_favorited',
             'is_in_shopping_cart',
+            'search',
+            'ordering',
         )
 
+    def tags_filter(self, queryset, name, value):
+        ids = tag_slugs.get()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=[ids[slug] for slug in value if slug in ids],
+        )))
+
     def is_favorited_filter(self, queryset, name, data):
         user = self.request.user
         if data and user.is_authenticated:
-            return queryset.filter(favorite_recipes__user=user)
+            return queryset.filter(Exists(FavoriteReceipe.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )))
         return queryset
 
     def is_in_shopping_cart_filter(self, queryset, name, data):
         user = self.request.user
         if data and user.is_authenticated:
-            return queryset.filter(shopping_recipes__user=user)
+            return queryset.filter(Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )))
         return queryset
 
+    def ordering_filter(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
 
-class IngredientFilter(SearchFilter):
+    def search_filter(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        if connection.vendor == 'postgresql':
+            return self.postgresql_search(queryset, value)
+        value = value.casefold()
+        ranks = {}
+        for pk, recipe_name, text in queryset.values_list(
+            'pk', 'name', 'text'
+        ):
+            if value in recipe_name.casefold():
+                ranks[pk] = 2
+            elif value in text.casefold():
+                ranks[pk] = 1
+        return queryset.filter(pk__in=ranks).annotate(search_rank=Case(
+            *(When(pk=pk, then=Value(rank)) for pk, rank in ranks.items()),
+            output_field=IntegerField(),
+        )).order_by('-search_rank', '-pub_date')
 
-    search_param = 'name'
+    def postgresql_search(self, queryset, value):
+        queryset = queryset.alias(search_vector=RECIPE_SEARCH_VECTOR)
+        if len(value) > settings.RECIPE_SEARCH_SHORT_QUERY_LENGTH:
+            query = SearchQuery(
+                value, config=settings.RECIPE_SEARCH_CONFIG,
+                search_type='websearch',
+            )
+            return queryset.filter(search_vector=query).annotate(
+                search_rank=SearchRank(RECIPE_SEARCH_VECTOR, query)
+            ).order_by('-search_rank', '-pub_date')
+        words = re.findall(r'\w+', value)
+        if not words:
+            return queryset.none()
+        query = SearchQuery(
+            ' & '.join(f'{word}:*' for word in words),
+            config=settings.RECIPE_SEARCH_CONFIG,
+            search_type='raw',
+        )
+        return queryset.filter(
+            Q(search_vector=query) | Q(name__trigram_similar=value)
+        ).annotate(search_rank=(
+            SearchRank(RECIPE_SEARCH_VECTOR, query)
+            + TrigramSimilarity('name', value)
+        )).order_by('-search_rank', '-pub_date')
@@ -0,0 +1,138 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models import Count
+
+from foodgram.cache import get_version
+from recipes.models import Ingredient
+from .replicas import primary_reads
+
+MAX_DISTANCE = 2
+
+
+def levenshtein(first, second):
+    if len(first) < len(second):
+        first, second = second, first
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current = [i]
+        for j, second_char in enumerate(second, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (first_char != second_char),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def deletions(word, max_distance):
+    variants = {word}
+    for _ in range(max_distance):
+        variants |= {
+            variant[:i] + variant[i + 1:]
+            for variant in variants for i in range(len(variant))
+        }
+    return variants
+
+
+class IngredientIndex:
+
+    def __init__(self, ingredients, usage):
+        self.ingredients = {
+            ingredient['id']: ingredient for ingredient in ingredients
+        }
+        self.usage = usage
+        self.names = sorted(
+            (ingredient['name'].lower(), ingredient['id'])
+            for ingredient in ingredients
+        )
+        self.words = {}
+        for name, pk in self.names:
+            for word in name.split():
+                self.words.setdefault(word, []).append(pk)
+        self.variants = {}
+        for word in self.words:
+            for variant in deletions(word, MAX_DISTANCE):
+                self.variants.setdefault(variant, []).append(word)
+
+    def rank(self, pk):
+        return -self.usage.get(pk, 0), self.ingredients[pk]['name']
+
+    def prefix_ids(self, prefix):
+        ids = []
+        for name, pk in self.names[bisect_left(self.names, (prefix,)):]:
+            if not name.startswith(prefix):
+                break
+            ids.append(pk)
+        return sorted(ids, key=self.rank)
+
+    def fuzzy_ids(self, query):
+        if (
+            len(query) < settings.INGREDIENT_SEARCH_FUZZY_MIN_LENGTH
+            or ' ' in query
+        ):
+            return []
+        max_distance = 1 if len(query) < 7 else MAX_DISTANCE
+        candidates = {
+            word for variant in deletions(query, max_distance)
+            for word in self.variants.get(variant, ())
+        }
+        ranked = {}
+        for word in candidates:
+            distance = levenshtein(query, word)
+            if distance > max_distance:
+                continue
+            for pk in self.words[word]:
+                ranked[pk] = min(distance, ranked.get(pk, distance))
+        return sorted(ranked, key=lambda pk: (ranked[pk], self.rank(pk)))
+
+    def search(self, query, limit=None):
+        query = query.strip().lower()
+        ids = self.prefix_ids(query)
+        if limit is None or len(ids) < limit:
+            seen = set(ids)
+            ids.extend(pk for pk in self.fuzzy_ids(query) if pk not in seen)
+        return [self.ingredients[pk] for pk in ids[:limit]]
+
+
+class IngredientIndexHolder:
+
+    def __init__(self):
+        self.index = None
+        self.version = None
+        self.built_at = 0
+        self.lock = threading.Lock()
+
+    def build(self):
+        ingredients = list(
+            Ingredient.objects.values('id', 'name', 'measurement_unit')
+        )
+        usage = dict(Ingredient.objects.annotate(
+            usage=Count('ingredient')
+        ).filter(usage__gt=0).values_list('id', 'usage'))
+        return IngredientIndex(ingredients, usage)
+
+    def is_stale(self, version):
+        return (
+            self.index is None
+            or version != self.version
+            or time.monotonic() - self.built_at
+            > settings.INGREDIENT_INDEX_TIMEOUT
+        )
+
+    def get(self):
+        version = get_version('ingredients')
+        if self.is_stale(version):
+            with self.lock:
+                if self.is_stale(version):
+                    with primary_reads():
+                        self.index = self.build()
+                    self.version = version
+                    self.built_at = time.monotonic()
+        return self.index
+
+
+ingredient_index = IngredientIndexHolder()
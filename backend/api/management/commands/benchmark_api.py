@@ -0,0 +1,144 @@
+import json
+import math
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+def percentile(samples, fraction):
+    return samples[max(0, math.ceil(fraction * len(samples)) - 1)]
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку и число SQL-запросов основных эндпоинтов '
+        'и выводит результат в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--endpoint', action='append', dest='endpoints',
+            help='Запустить только указанные эндпоинты.',
+        )
+        parser.add_argument('--output', help='Файл для результата.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        user = User.objects.filter(
+            follower__isnull=False, shopping_user__isnull=False
+        ).distinct().order_by('id').first()
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        if user is None or not recipe_ids:
+            raise CommandError(
+                'Недостаточно данных, запустите seed_foodgram.'
+            )
+        tags = list(Tag.objects.values_list('slug', flat=True))
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        anonymous = APIClient(SERVER_NAME='localhost')
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(HTTP_AUTHORIZATION='Token {}'.format(
+            Token.objects.get_or_create(user=user)[0].key
+        ))
+        endpoints = {
+            'recipe_list': lambda: (anonymous, '/api/recipes/?limit=6'),
+            'recipe_list_tags': lambda: (
+                anonymous,
+                '/api/recipes/?' + '&'.join(
+                    f'tags={slug}' for slug in rng.sample(
+                        tags, min(2, len(tags))
+                    )
+                ),
+            ),
+            'recipe_list_authenticated': lambda: (
+                client, '/api/recipes/?limit=6&is_favorited=1'
+            ),
+            'recipe_detail': lambda: (
+                anonymous, f'/api/recipes/{rng.choice(recipe_ids)}/'
+            ),
+            'feed': lambda: (client, '/api/recipes/feed/?limit=6'),
+            'subscriptions': lambda: (
+                client, '/api/users/subscriptions/?recipes_limit=3'
+            ),
+            'download_shopping_cart': lambda: (
+                client, '/api/recipes/download_shopping_cart/'
+            ),
+            'ingredient_search': lambda: (
+                anonymous,
+                '/api/ingredients/?name={}'.format(
+                    rng.choice(names)[:rng.randint(1, 4)]
+                ),
+            ),
+        }
+        selected = options['endpoints'] or list(endpoints)
+        unknown = set(selected) - endpoints.keys()
+        if unknown:
+            raise CommandError(
+                'Неизвестные эндпоинты: ' + ', '.join(sorted(unknown))
+            )
+        results = {
+            name: self.run(
+                endpoints[name], options['warmup'], options['iterations']
+            )
+            for name in selected
+        }
+        report = json.dumps({
+            'database': connection.vendor,
+            'users': User.objects.count(),
+            'recipes': len(recipe_ids),
+            'iterations': options['iterations'],
+            'endpoints': results,
+        }, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report + '\n')
+        self.stdout.write(report)
+
+    def request(self, make_request):
+        client, path = make_request()
+        response = client.get(path)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def run(self, make_request, warmup, iterations):
+        for _ in range(warmup):
+            self.request(make_request)
+        queries = []
+        statuses = set()
+        for _ in range(min(iterations, 10)):
+            with CaptureQueriesContext(connection) as context:
+                statuses.add(self.request(make_request).status_code)
+            queries.append(len(context.captured_queries))
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            self.request(make_request)
+            timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'status': sorted(statuses),
+            'queries_min': min(queries),
+            'queries_max': max(queries),
+            **summarize(timings),
+        }
@@ -0,0 +1,105 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.encoding import iri_to_uri
+
+from .benchmark_api import summarize
+
+DEFAULT_PATHS = (
+    '/api/recipes/?limit=6',
+    '/api/recipes/{recipe_id}/',
+    '/api/tags/',
+    '/api/ingredients/?name=Ин',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает запущенный сервер параллельными запросами и выводит '
+        'пропускную способность и задержки в JSON. Запускается отдельно '
+        'против развёртываний с SERVER_MODE=wsgi и SERVER_MODE=asgi.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument(
+            '--concurrency', default='1,8,32',
+            help='Уровни параллелизма через запятую.',
+        )
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Пути запросов, {recipe_id} подставляется из --recipe-id.',
+        )
+        parser.add_argument('--recipe-id', type=int, default=1)
+        parser.add_argument('--token', help='Токен для авторизации.')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--label', help='Метка развёртывания в отчёте.')
+        parser.add_argument('--output', help='Файл для результата.')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [
+                int(level) for level in options['concurrency'].split(',')
+            ]
+        except ValueError:
+            raise CommandError('--concurrency: ожидается список чисел.')
+        self.headers = {'Accept': 'application/json'}
+        if options['token']:
+            self.headers['Authorization'] = f'Token {options["token"]}'
+        self.timeout = options['timeout']
+        base = options['url'].rstrip('/')
+        urls = [
+            iri_to_uri(base + path.format(recipe_id=options['recipe_id']))
+            for path in options['paths'] or DEFAULT_PATHS
+        ]
+        for url in urls:
+            self.request(url)
+        report = json.dumps({
+            'label': options['label'],
+            'url': base,
+            'requests': options['requests'],
+            'levels': {
+                level: self.run(urls, level, options['requests'])
+                for level in levels
+            },
+        }, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report + '\n')
+        self.stdout.write(report)
+
+    def request(self, url):
+        started = time.perf_counter()
+        try:
+            with urlopen(
+                Request(url, headers=self.headers), timeout=self.timeout
+            ) as response:
+                response.read()
+                status = response.status
+        except HTTPError as error:
+            status = error.code
+        except OSError:
+            status = None
+        return status, (time.perf_counter() - started) * 1000
+
+    def run(self, urls, concurrency, requests):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(
+                self.request,
+                (urls[number % len(urls)] for number in range(requests)),
+            ))
+        elapsed = time.perf_counter() - started
+        return {
+            'rps': round(requests / elapsed, 1),
+            'errors': sum(
+                1 for status, _ in results
+                if status is None or status >= 500
+            ),
+            **summarize(timing for _, timing in results),
+        }
@@ -0,0 +1,56 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.ingredient_index import ingredient_index
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск ингредиентов по префиксу через ORM '
+        'и через индекс в памяти.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def measure(self, search, queries):
+        started = time.perf_counter()
+        for query in queries:
+            search(query)
+        return (time.perf_counter() - started) / len(queries) * 1000
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            self.stderr.write('Нет ингредиентов, загрузите их сначала.')
+            return
+        rng = random.Random(options['seed'])
+        queries = [
+            name[:rng.randint(1, min(len(name), 6))]
+            for name in rng.choices(names, k=options['queries'])
+        ]
+        limit = options['limit']
+        started = time.perf_counter()
+        ingredient_index.build()
+        build_ms = (time.perf_counter() - started) * 1000
+        orm_ms = self.measure(
+            lambda query: list(Ingredient.objects.filter(
+                name__istartswith=query
+            ).values('id', 'name', 'measurement_unit')[:limit]),
+            queries,
+        )
+        index_ms = self.measure(
+            lambda query: ingredient_index.get().search(query, limit),
+            queries,
+        )
+        self.stdout.write(
+            f'Запросов: {len(queries)}, ингредиентов: {len(names)}\n'
+            f'Построение индекса: {build_ms:.1f} мс\n'
+            f'ORM: {orm_ms:.3f} мс на запрос\n'
+            f'Индекс: {index_ms:.3f} мс на запрос'
+        )
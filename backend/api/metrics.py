@@ -0,0 +1,248 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.response import Response
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        position = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0
+                ]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.help_text}',
+            f'# TYPE {self.name} histogram',
+        ]
+        with self.lock:
+            series = [
+                (labels, list(counts), total, count)
+                for labels, (counts, total, count) in self.series.items()
+            ]
+        for labels, counts, total, count in sorted(series):
+            label_text = ','.join(
+                f'{name}="{value}"' for name, value in labels
+            )
+            cumulative = 0
+            for bound, bucket_count in zip(
+                (*self.buckets, '+Inf'), counts
+            ):
+                cumulative += bucket_count
+                lines.append(
+                    f'{self.name}_bucket{{{label_text},le="{bound}"}} '
+                    f'{cumulative}'
+                )
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return '\n'.join(lines)
+
+
+request_duration = Histogram(
+    'foodgram_request_duration_seconds',
+    'Total request processing time.',
+    DURATION_BUCKETS,
+)
+db_duration = Histogram(
+    'foodgram_request_db_duration_seconds',
+    'Time spent in SQL queries per request.',
+    DURATION_BUCKETS,
+)
+db_queries = Histogram(
+    'foodgram_request_db_queries',
+    'Number of SQL queries per request.',
+    QUERY_BUCKETS,
+)
+serialize_duration = Histogram(
+    'foodgram_request_serialize_duration_seconds',
+    'Time spent building serializer data.',
+    DURATION_BUCKETS,
+)
+render_duration = Histogram(
+    'foodgram_request_render_duration_seconds',
+    'Time spent rendering the response body.',
+    DURATION_BUCKETS,
+)
+HISTOGRAMS = (
+    request_duration, db_duration, db_queries, serialize_duration,
+    render_duration,
+)
+
+
+class QueryTimer:
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+current_query_timer = ContextVar('current_query_timer', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    timer = current_query_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+@receiver(request_started)
+def request_thread_started(sender, **kwargs):
+    for connection in connections.all():
+        install_query_recorder(connection)
+
+
+class RequestTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_query_timer.reset(token)
+        return self.finish(request, response, started)
+
+    async def __acall__(self, request):
+        started, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_query_timer.reset(token)
+        return self.finish(request, response, started)
+
+    def start(self, request):
+        request.serialize_duration = 0.0
+        request.render_duration = 0.0
+        request.query_timer = QueryTimer()
+        return time.perf_counter(), current_query_timer.set(
+            request.query_timer
+        )
+
+    def finish(self, request, response, started):
+        total = time.perf_counter() - started
+        queries = request.query_timer
+        serialize = request.serialize_duration
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={queries.duration * 1000:.1f};'
+            f'desc="{queries.count} queries"',
+            f'serialize;dur={serialize * 1000:.1f}',
+            f'render;dur={request.render_duration * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        match = request.resolver_match
+        labels = (
+            ('route', match.view_name if match else 'unmatched'),
+            ('method', request.method),
+        )
+        request_duration.observe(labels, total)
+        db_duration.observe(labels, queries.duration)
+        db_queries.observe(labels, queries.count)
+        serialize_duration.observe(labels, serialize)
+        render_duration.observe(labels, request.render_duration)
+        return response
+
+    def process_template_response(self, request, response):
+        if response.is_rendered:
+            return response
+        start = time.perf_counter()
+
+        def rendered(response):
+            request.render_duration += time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class SerializeTimingMixin:
+
+    def serialize(self, serializer):
+        started = time.perf_counter()
+        data = serializer.data
+        request = self.request._request
+        if hasattr(request, 'serialize_duration'):
+            request.serialize_duration += time.perf_counter() - started
+        return data
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                self.serialize(self.get_serializer(page, many=True))
+            )
+        return Response(
+            self.serialize(self.get_serializer(queryset, many=True))
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(
+            self.serialize(self.get_serializer(self.get_object()))
+        )
+
+
+def metrics_view(request):
+    if not (
+        request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+        or request.user.is_staff
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        '\n'.join(histogram.render() for histogram in HISTOGRAMS) + '\n',
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,5 +1,250 @@
+import base64
+import hashlib
+import json
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from foodgram.cache import get_version
+from .replicas import primary_reads
+
+
+def estimate_count(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountDjangoPaginator(Paginator):
+
+    def __init__(self, *args, count_cache_key=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_cache_key = count_cache_key
+        self.count_is_exact = True
+
+    def compute_count(self):
+        queryset = self.object_list
+        if connections[queryset.db].vendor == 'postgresql':
+            estimate = estimate_count(queryset)
+            if estimate >= settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD:
+                return estimate, False
+        return queryset.count(), True
+
+    @cached_property
+    def count(self):
+        if self.count_cache_key is None:
+            count, self.count_is_exact = self.compute_count()
+            return count
+        cached = cache.get(self.count_cache_key)
+        if cached is None:
+            with primary_reads():
+                cached = self.compute_count()
+            cache.set(
+                self.count_cache_key, cached,
+                settings.PAGINATION_COUNT_CACHE_TIMEOUT,
+            )
+        count, self.count_is_exact = cached
+        return count
 
 
 class LimitPaginator(PageNumberPagination):
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    cursor_page_size = 6
+    cursor_ordering = ('-pub_date', '-id')
+    cursor_only = False
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (
+            self.cursor_only
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.ordering = self.get_cursor_ordering(queryset, view)
+        self.page_size_value = (
+            self.get_page_size(request) or self.cursor_page_size
+        )
+        values, self.reverse = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param)
+        )
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [self.invert(field) for field in ordering]
+        querysets = (
+            queryset if isinstance(queryset, (list, tuple)) else [queryset]
+        )
+        page = []
+        for queryset in querysets:
+            queryset = queryset.order_by(*ordering)
+            if values is not None:
+                queryset = queryset.filter(
+                    self.keyset_filter(ordering, values)
+                )
+            page.extend(queryset[:self.page_size_value + 1])
+        if len(querysets) > 1:
+            page = self.merge(page, ordering)
+        has_more = len(page) > self.page_size_value
+        page = page[:self.page_size_value]
+        if self.reverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+        self.page = page
+        return page
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.page:
+            return None
+        return self.cursor_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param
+            )
+        return self.cursor_link(self.page[0], reverse=True)
+
+    def cursor_link(self, obj, reverse):
+        values = [
+            getattr(obj, field.lstrip('-')) for field in self.ordering
+        ]
+        cursor = base64.urlsafe_b64encode(json.dumps(
+            {'v': values, 'r': reverse}, default=str
+        ).encode()).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param, cursor,
+        )
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values, reverse = data['v'], bool(data['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(
+            self.ordering
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def get_cursor_ordering(self, queryset, view):
+        default = tuple(getattr(
+            view, 'cursor_ordering', self.cursor_ordering
+        ))
+        if isinstance(queryset, (list, tuple)):
+            return default
+        ordering = tuple(queryset.query.order_by)
+        if not ordering or not all(
+            isinstance(field, str) and field.lstrip('-') != '?'
+            for field in ordering
+        ):
+            return default
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering += ('-id' if ordering[0].startswith('-') else 'id',)
+        return ordering
+
+    @staticmethod
+    def merge(objects, ordering):
+        objects = list({obj.pk: obj for obj in objects}.values())
+        for field in reversed(ordering):
+            objects.sort(
+                key=attrgetter(field.lstrip('-')),
+                reverse=field.startswith('-'),
+            )
+        return objects
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def keyset_filter(ordering, values):
+        condition = Q()
+        for position, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[position]})
+            for previous, value in zip(ordering[:position], values):
+                step &= Q(**{previous.lstrip('-'): value})
+            condition |= step
+        return condition
+
+
+class SubscriptionsPaginator(LimitPaginator):
+    page_size = 6
+
+
+class FeedPaginator(LimitPaginator):
+    cursor_only = True
+    cursor_ordering = ('-feed_pub_date', '-feed_recipe_id')
+
+
+class EstimatedCountPaginator(LimitPaginator):
+
+    def django_paginator_class(self, object_list, per_page):
+        return EstimatedCountDjangoPaginator(
+            object_list, per_page, count_cache_key=self.count_cache_key
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_cache_key = self.get_count_cache_key(request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count_cache_key(self, request, view):
+        version_name = getattr(view, 'count_cache_version', None)
+        cache_params = getattr(view, 'count_cache_params', ())
+        ignored_params = (self.page_query_param, self.page_size_query_param)
+        if version_name is None or any(
+            param not in cache_params and param not in ignored_params
+            for param in request.query_params
+        ):
+            return None
+        params = sorted(
+            (param, sorted(request.query_params.getlist(param)))
+            for param in cache_params if param in request.query_params
+        )
+        digest = hashlib.sha1(repr(params).encode()).hexdigest()
+        return (
+            f'count:{version_name}:{get_version(version_name)}:{digest}'
+        )
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if not self.cursor_mode:
+            response.data['count_exact'] = self.page.paginator.count_is_exact
+        return response
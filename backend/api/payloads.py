@@ -0,0 +1,72 @@
+import gzip
+import hashlib
+import threading
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from foodgram.cache import get_version
+from recipes.models import Ingredient, Tag
+from .replicas import primary_reads
+from .serializers import IngredientSerializer, TagSerializer
+
+
+class PrebuiltPayload:
+
+    def __init__(self, version_name, build):
+        self.version_name = version_name
+        self.build = build
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        version = get_version(self.version_name)
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot[0] == version:
+            return snapshot
+        with self.lock:
+            snapshot = self.snapshot
+            if snapshot is not None and snapshot[0] == version:
+                return snapshot
+            with primary_reads():
+                body = JSONRenderer().render(self.build())
+            digest = hashlib.sha1(body).hexdigest()
+            snapshot = self.snapshot = (
+                version,
+                (body, f'"{digest}"'),
+                (gzip.compress(body, compresslevel=9), f'"{digest}-gzip"'),
+            )
+            return snapshot
+
+    def not_modified(self, request, etag):
+        etags = parse_etags(request.headers.get('If-None-Match', ''))
+        return '*' in etags or etag in (
+            tag[2:] if tag.startswith('W/') else tag for tag in etags
+        )
+
+    def response(self, request):
+        _, identity, gzipped = self.refresh()
+        use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+        body, etag = gzipped if use_gzip else identity
+        if self.not_modified(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, no-cache'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+tags_payload = PrebuiltPayload(
+    'tags',
+    lambda: TagSerializer(Tag.objects.all(), many=True).data,
+)
+ingredients_payload = PrebuiltPayload(
+    'ingredients',
+    lambda: IngredientSerializer(Ingredient.objects.all(), many=True).data,
+)
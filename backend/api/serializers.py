@@ -1,12 +1,17 @@
 import base64
 
+from django.conf import settings
 from django.core.files.base import ContentFile
-from rest_framework.serializers import (ImageField, ModelSerializer, CharField,
-                                        PrimaryKeyRelatedField, ReadOnlyField,
-                                        SerializerMethodField, ValidationError)
-
-from foodgram.settings import MIN_VALIDATE_VALUE
-from recipes.models import Ingredient, IngredientInRecipesAmount, Recipe, Tag
+from django.db import transaction
+from rest_framework.serializers import (CharField, Field, ImageField,
+                                        IntegerField, ListField,
+                                        ModelSerializer, ReadOnlyField,
+                                        Serializer, SerializerMethodField,
+                                        ValidationError)
+
+from foodgram.cache import bump_version
+from recipes.models import (Ingredient, IngredientInRecipesAmount, Recipe,
+                            ShoppingCart, ShoppingListIngredient, Tag)
 from users.models import Follow, User
 
 
@@ -44,6 +49,37 @@ class Base64ImageField(ImageField):
         return super().to_internal_value(data)
 
 
+class IdListField(ListField):
+    child = IntegerField(min_value=1)
+
+    def to_representation(self, manager):
+        return [obj.pk for obj in manager.all()]
+
+
+class ImageSrcsetField(Field):
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        storage = recipe.image.storage
+        srcset = {}
+        for image_format in ('jpeg', 'webp'):
+            urls = []
+            for width, name in recipe.image_variants.get(
+                image_format, {}
+            ).items():
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls.append(f'{url} {width}w')
+            srcset[image_format] = ', '.join(urls)
+        return srcset
+
+
 class TagSerializer(ModelSerializer):
 
     class Meta:
@@ -71,7 +107,8 @@ class UserSerializer(ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if user is None or user.is_anonymous:
             return False
@@ -89,6 +126,7 @@ class UserCreateSerializer(ModelSerializer):
 
 class ShoppingListFavoiriteSerializer(ModelSerializer):
     image = Base64ImageField(read_only=True)
+    image_srcset = ImageSrcsetField()
     name = ReadOnlyField()
     cooking_time = ReadOnlyField()
 
@@ -98,10 +136,19 @@ class ShoppingListFavoiriteSerializer(ModelSerializer):
             'id',
             'name',
             'image',
+            'image_srcset',
             'cooking_time',
         )
 
 
+class RecipeIdsSerializer(Serializer):
+    recipes = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_BATCH_MAX_SIZE,
+    )
+
+
 class FollowSerializer(ModelSerializer):
     email = ReadOnlyField(source='author.email')
     id = ReadOnlyField(source='author.id')
@@ -110,7 +157,7 @@ class FollowSerializer(ModelSerializer):
     last_name = ReadOnlyField(source='author.last_name')
     is_subscribed = SerializerMethodField()
     recipes = SerializerMethodField()
-    recipes_count = SerializerMethodField()
+    recipes_count = ReadOnlyField(source='author.recipes_count')
 
     class Meta:
         model = User
@@ -126,7 +173,7 @@ class FollowSerializer(ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        return Follow.objects.filter(user=obj.user, author=obj.author).exists()
+        return True
 
     def validate(self, data):
         author = self.instance
@@ -141,22 +188,22 @@ class FollowSerializer(ModelSerializer):
             )
         return data
 
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
-
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        query_params = request.query_params
-        queryset = Recipe.objects.filter(author=obj.author)
-        if 'recipes_limit' in query_params:
-            recipes_limit = query_params['recipes_limit']
-            queryset = queryset[:int(recipes_limit)]
+        if hasattr(obj, 'author_recipes'):
+            queryset = obj.author_recipes
+        else:
+            request = self.context.get('request')
+            query_params = request.query_params
+            queryset = Recipe.objects.filter(author=obj.author)
+            if 'recipes_limit' in query_params:
+                recipes_limit = query_params['recipes_limit']
+                queryset = queryset[:int(recipes_limit)]
         serializer = ShoppingListFavoiriteSerializer(queryset, many=True)
         return serializer.data
 
 
 class IngredientsInRecipeWriteSerializer(ModelSerializer):
-    id = PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = IntegerField(min_value=1)
 
     class Meta:
         model = IngredientInRecipesAmount
@@ -179,6 +226,7 @@ class RecipesReadSerializer(ModelSerializer):
         read_only=True
     )
     image = Base64ImageField()
+    image_srcset = ImageSrcsetField()
 
     class Meta:
         model = Recipe
@@ -189,13 +237,21 @@ class RecipesReadSerializer(ModelSerializer):
             'ingredients',
             'name',
             'image',
+            'image_srcset',
             'text',
             'cooking_time',
             'is_favorited',
             'is_in_shopping_cart',
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_subscribed'):
+            instance.author.is_subscribed = instance.is_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         return (
             user.is_authenticated
@@ -203,6 +259,8 @@ class RecipesReadSerializer(ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         return (
             user.is_authenticated
@@ -211,7 +269,7 @@ class RecipesReadSerializer(ModelSerializer):
 
 
 class RecipesWriteSerializer(ModelSerializer):
-    tags = PrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
+    tags = IdListField()
     ingredients = IngredientsInRecipeWriteSerializer(many=True,
                                                      source='recipe')
     image = Base64ImageField()
@@ -232,36 +290,76 @@ class RecipesWriteSerializer(ModelSerializer):
         read_only_fields = ('author',)
 
     def validate(self, data):
-        ingredients = data['recipe']
-        tags = data['tags']
-        cooking_time = data['cooking_time']
-        ingredients_list = []
-        if not ingredients:
-            raise ValidationError(
-                'Укажите ингредиенты!'
-            )
-        if not tags:
-            raise ValidationError(
-                'Укажите тэг!'
-            )
-        for ingredient in ingredients:
-            ingredient_id = ingredient['id']
-            if ingredient_id in ingredients_list:
+        ingredients = data.get('recipe')
+        tags = data.get('tags')
+        cooking_time = data.get('cooking_time')
+        if ingredients is not None:
+            if not ingredients:
+                raise ValidationError(
+                    'Укажите ингредиенты!'
+                )
+            ingredient_ids = {
+                ingredient['id'] for ingredient in ingredients
+            }
+            if len(ingredient_ids) != len(ingredients):
                 raise ValidationError(
                     'Ингредиенты должны быть уникальными'
                 )
-            ingredients_list.append(ingredient_id)
-            amount = ingredient['amount']
-            if int(amount) < MIN_VALIDATE_VALUE:
+            if any(
+                int(ingredient['amount']) < settings.MIN_VALIDATE_VALUE
+                for ingredient in ingredients
+            ):
                 raise ValidationError(
                     'Количество ингридиента должно быть больше 0'
                 )
-        if int(cooking_time) < MIN_VALIDATE_VALUE:
+        if tags is not None and not tags:
+            raise ValidationError(
+                'Укажите тэг!'
+            )
+        if (
+            cooking_time is not None
+            and int(cooking_time) < settings.MIN_VALIDATE_VALUE
+        ):
             raise ValidationError(
                 'Время приготовления должно быть больше 0!'
             )
+        self.resolve_references(data)
         return data
 
+    def resolve_references(self, data):
+        errors = {}
+        ingredients = data.get('recipe')
+        if ingredients is not None:
+            found = Ingredient.objects.in_bulk(
+                {ingredient['id'] for ingredient in ingredients}
+            )
+            missing = [
+                str(ingredient['id']) for ingredient in ingredients
+                if ingredient['id'] not in found
+            ]
+            if missing:
+                errors['ingredients'] = [
+                    'Не найдены ингредиенты с id: ' + ', '.join(missing)
+                ]
+            else:
+                for ingredient in ingredients:
+                    ingredient['id'] = found[ingredient['id']]
+        tags = data.get('tags')
+        if tags is not None:
+            tag_ids = list(dict.fromkeys(tags))
+            found = Tag.objects.in_bulk(tag_ids)
+            missing = [
+                str(tag_id) for tag_id in tag_ids if tag_id not in found
+            ]
+            if missing:
+                errors['tags'] = [
+                    'Не найдены теги с id: ' + ', '.join(missing)
+                ]
+            else:
+                data['tags'] = [found[tag_id] for tag_id in tag_ids]
+        if errors:
+            raise ValidationError(errors)
+
     def validate_name(self, value):
         if len(value) > 200:
             raise ValidationError(
@@ -278,6 +376,7 @@ class RecipesWriteSerializer(ModelSerializer):
             ) for ingredient in ingredients]
         )
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('recipe')
@@ -287,11 +386,55 @@ class RecipesWriteSerializer(ModelSerializer):
         self.create_update_ingredient(ingredients, recipe)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        current = {
+            amount.ingredient_id: amount
+            for amount in IngredientInRecipesAmount.objects.filter(
+                recipe=recipe
+            )
+        }
+        amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = current.keys() - amounts.keys()
+        changed = [
+            amount for ingredient_id, amount in current.items()
+            if ingredient_id in amounts
+            and amount.amount != amounts[ingredient_id]
+        ]
+        for amount in changed:
+            amount.amount = amounts[amount.ingredient_id]
+        added = [
+            ingredient for ingredient in ingredients
+            if ingredient['id'].id not in current
+        ]
+        if removed:
+            IngredientInRecipesAmount.objects.filter(
+                recipe=recipe, ingredient__in=removed
+            ).delete()
+        if changed:
+            IngredientInRecipesAmount.objects.bulk_update(
+                changed, ['amount']
+            )
+        if added:
+            self.create_update_ingredient(added, recipe)
+        affected = removed.union(
+            amount.ingredient_id for amount in changed
+        ).union(ingredient['id'].id for ingredient in added)
+        if affected:
+            bump_version(f'recipe:{recipe.id}')
+            ShoppingListIngredient.objects.refresh(
+                ShoppingCart.objects.filter(recipe=recipe).values('user'),
+                affected,
+            )
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        ingredients = validated_data.pop('recipe')
-        instance.ingredients.clear()
-        self.create_update_ingredient(ingredients, instance)
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        ingredients = validated_data.pop('recipe', None)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
         return super().update(instance, validated_data)
@@ -0,0 +1,43 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from foodgram.cache import bump_version
+from recipes.models import Ingredient, IngredientInRecipesAmount, Recipe, Tag
+from users.models import User
+from .authentication import AUTH_VERSION, token_cache
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipesAmount)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    bump_version(f'recipe:{instance.recipe_id}')
+    bump_version('recipes')
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(sender, instance, **kwargs):
+    bump_version('ingredients')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipes_changed(sender, **kwargs):
+    bump_version('recipes')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(sender, instance, **kwargs):
+    bump_version('tags')
+
+
+@receiver((post_save, post_delete), sender=User)
+def user_changed(sender, instance, **kwargs):
+    token_cache.delete_user(instance.pk)
+    bump_version(AUTH_VERSION.format(instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    token_cache.delete(instance.key)
+    bump_version(AUTH_VERSION.format(instance.user_id))
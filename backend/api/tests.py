@@ -0,0 +1,629 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections, router
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from foodgram.cache import VERSION_CACHE
+from recipes.models import (FavoriteReceipe, ImageBlob, Ingredient,
+                            IngredientInRecipesAmount, Recipe, ShoppingCart,
+                            ShoppingListIngredient, ShoppingListManager, Tag)
+from users.models import Follow, User
+from .authentication import token_cache
+from .replicas import PIN_KEY
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-tests-')
+REPLICA = 'test_replica'
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'versions',
+    },
+}
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+def image_file(color='white'):
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+    return SimpleUploadedFile(
+        'image.png', buffer.getvalue(), content_type='image/png'
+    )
+
+
+def stored_image(color='white'):
+    field = Recipe._meta.get_field('image')
+    return field.storage.save(
+        field.generate_filename(None, 'image.png'), image_file(color)
+    )
+
+
+@override_settings(CACHES=LOCMEM_CACHES, MEDIA_ROOT=MEDIA_ROOT)
+class RecipeListQueriesTest(APITestCase):
+    page_sizes = (1, 10, 100)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        tags = [
+            Tag.objects.create(
+                name=f'Тэг {number}', color=f'#00000{number}',
+                slug=f'tag-{number}',
+            )
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(5)
+        ]
+        image_name = stored_image()
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=10, image=image_name,
+            )
+            for number in range(110)
+        )
+        recipes = list(Recipe.objects.order_by('id'))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag.pk)
+            for recipe in recipes for tag in tags[:2]
+        )
+        IngredientInRecipesAmount.objects.bulk_create(
+            IngredientInRecipesAmount(
+                recipe=recipe, ingredient=ingredient, amount=100
+            )
+            for recipe in recipes for ingredient in ingredients[:3]
+        )
+        FavoriteReceipe.objects.bulk_create(
+            FavoriteReceipe(user=cls.reader, recipe=recipe)
+            for recipe in recipes[::2]
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.reader, recipe=recipe)
+            for recipe in recipes[::3]
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+
+    def assert_list_queries(self, queries):
+        for page_size in self.page_sizes:
+            with self.subTest(page_size=page_size):
+                cache.clear()
+                token_cache.entries.clear()
+                with self.assertNumQueries(queries):
+                    response = self.client.get(
+                        '/api/recipes/', {'limit': page_size}
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), page_size)
+
+    def test_anonymous_list_queries(self):
+        self.assert_list_queries(5)
+
+    def test_authenticated_list_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assert_list_queries(7)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES, MEDIA_ROOT=MEDIA_ROOT, DATABASE_REPLICAS=[REPLICA]
+)
+class ReplicaRouterTest(APITransactionTestCase):
+    databases = '__all__'
+    recipes_url = '/api/recipes/?limit=6'
+
+    @classmethod
+    def setUpClass(cls):
+        connections.databases[REPLICA] = {
+            **connections['default'].settings_dict,
+            'TEST': {'MIRROR': 'default'},
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+
+    def setUp(self):
+        patcher = mock.patch('recipes.signals.schedule_fan_out')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        self.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+        image = stored_image()
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст', cooking_time=10,
+            image=image, image_variants={'source': image},
+        )
+        cache.clear()
+        token_cache.entries.clear()
+        self.client.force_authenticate(self.reader)
+
+    def request(self, method, path):
+        primary = CaptureQueriesContext(connections['default'])
+        replica = CaptureQueriesContext(connections[REPLICA])
+        with primary, replica:
+            response = getattr(self.client, method)(path)
+        return response, len(primary), len(replica)
+
+    def test_writes_go_to_default(self):
+        self.assertEqual(router.db_for_write(Recipe), 'default')
+        response, primary, replica = self.request(
+            'post', f'/api/recipes/{self.recipe.pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_unpinned_read_goes_to_replica(self):
+        self.client.get(self.recipes_url)
+        response, primary, replica = self.request('get', self.recipes_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_read_after_write_is_pinned_to_default(self):
+        self.request('post', f'/api/recipes/{self.recipe.pk}/favorite/')
+        response, primary, replica = self.request('get', self.recipes_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'][0]['is_favorited'])
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_pin_is_per_user_and_expires(self):
+        self.request('post', f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.client.force_authenticate(self.author)
+        self.client.get(self.recipes_url)
+        _, primary, replica = self.request('get', self.recipes_url)
+        self.assertEqual((primary, replica > 0), (0, True))
+        self.client.force_authenticate(self.reader)
+        cache.delete(PIN_KEY.format(self.reader.pk))
+        _, primary, replica = self.request('get', self.recipes_url)
+        self.assertEqual((primary, replica > 0), (0, True))
+
+    def test_version_keyed_caches_are_rebuilt_from_default(self):
+        _, primary, replica = self.request('get', self.recipes_url)
+        self.assertGreater(primary, 0)
+        self.assertGreater(replica, 0)
+        _, primary, _ = self.request('get', self.recipes_url)
+        self.assertEqual(primary, 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TokenCacheInvalidationTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        cache.clear()
+        caches[VERSION_CACHE].clear()
+        token_cache.entries.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(self.me().status_code, 200)
+
+    def me(self):
+        return self.client.get('/api/users/me/')
+
+    def test_logout_drops_cached_token(self):
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_deactivation_drops_cached_token(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_evicted_version_does_not_revive_token(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {Token._meta.db_table} WHERE key = %s',
+                [self.token.key],
+            )
+        caches[VERSION_CACHE].clear()
+        self.assertEqual(self.me().status_code, 401)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES, MEDIA_ROOT=MEDIA_ROOT,
+    SHOPPING_CART_STREAMING=False,
+)
+class AsgiShoppingCartDownloadTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Текст', cooking_time=10,
+            image=image_file(),
+        )
+        IngredientInRecipesAmount.objects.create(
+            recipe=recipe,
+            ingredient=Ingredient.objects.create(
+                name='Мука', measurement_unit='г'
+            ),
+            amount=200,
+        )
+        ShoppingCart.objects.add(cls.user, [recipe.pk])
+
+    async def test_download_under_asgi(self):
+        for file_format in ('txt', 'csv', 'pdf'):
+            cache.clear()
+            response = await self.async_client.get(
+                '/api/recipes/download_shopping_cart/',
+                {'format': file_format},
+                authorization=f'Token {self.token.key}',
+            )
+            self.assertEqual(response.status_code, 200)
+            content = b''.join(response.streaming_content)
+            self.assertTrue(content)
+            if file_format != 'pdf':
+                self.assertIn('Мука'.encode(), content)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, MEDIA_ROOT=MEDIA_ROOT)
+class ShoppingListAggregateTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        cls.readers = [
+            User.objects.create_user(
+                username=f'reader{number}',
+                email=f'reader{number}@example.com', password='pass',
+            )
+            for number in range(3)
+        ]
+        cls.flour = Ingredient.objects.create(
+            name='Мука', measurement_unit='г'
+        )
+        cls.sugar = Ingredient.objects.create(
+            name='Сахар', measurement_unit='г'
+        )
+        image = stored_image()
+        cls.pie, cls.bread = [
+            Recipe.objects.create(
+                author=cls.author, name=name, text='Текст', cooking_time=10,
+                image=image, image_variants={'source': image},
+            )
+            for name in ('Пирог', 'Хлеб')
+        ]
+        IngredientInRecipesAmount.objects.bulk_create([
+            IngredientInRecipesAmount(
+                recipe=cls.pie, ingredient=cls.flour, amount=200
+            ),
+            IngredientInRecipesAmount(
+                recipe=cls.pie, ingredient=cls.sugar, amount=50
+            ),
+            IngredientInRecipesAmount(
+                recipe=cls.bread, ingredient=cls.flour, amount=500
+            ),
+        ])
+
+    def shopping_list(self, user):
+        return dict(ShoppingListIngredient.objects.filter(
+            user=user
+        ).values_list('ingredient__name', 'total_amount'))
+
+    def test_cart_changes_update_totals(self):
+        reader = self.readers[0]
+        ShoppingCart.objects.add(reader, [self.pie.pk, self.bread.pk])
+        self.assertEqual(
+            self.shopping_list(reader), {'Мука': 700, 'Сахар': 50}
+        )
+        ShoppingCart.objects.remove(reader, [self.pie.pk])
+        self.assertEqual(self.shopping_list(reader), {'Мука': 500})
+        ShoppingCart.objects.remove(reader, [self.bread.pk])
+        self.assertEqual(self.shopping_list(reader), {})
+
+    def test_recipe_delete_refreshes_each_user_once(self):
+        for reader in self.readers:
+            ShoppingCart.objects.add(reader, [self.pie.pk, self.bread.pk])
+        with mock.patch.object(
+            ShoppingListManager, 'refresh', autospec=True,
+            side_effect=ShoppingListManager.refresh,
+        ) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.pie.delete()
+        refresh.assert_called_once()
+        self.assertEqual(
+            sorted(refresh.call_args[0][1]),
+            sorted(reader.pk for reader in self.readers),
+        )
+        for reader in self.readers:
+            self.assertEqual(self.shopping_list(reader), {'Мука': 500})
+
+
+@override_settings(CACHES=LOCMEM_CACHES, MEDIA_ROOT=MEDIA_ROOT)
+class ImageBlobReferencesTest(APITestCase):
+
+    def setUp(self):
+        patcher = mock.patch('recipes.signals.schedule_variants')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+
+    def create_recipe(self, color):
+        with self.captureOnCommitCallbacks():
+            return Recipe.objects.create(
+                author=self.author, name='Рецепт', text='Текст',
+                cooking_time=10, image=image_file(color),
+            )
+
+    def references(self, name):
+        blob = ImageBlob.objects.filter(name=name).first()
+        return blob and blob.references_count
+
+    def test_identical_images_share_one_blob(self):
+        first = self.create_recipe('red')
+        second = self.create_recipe('red')
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(self.references(name), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self.references(name), 1)
+        self.assertTrue(first.image.storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertIsNone(self.references(name))
+        self.assertFalse(first.image.storage.exists(name))
+
+    def test_replaced_image_is_released(self):
+        recipe = self.create_recipe('red')
+        old_name = recipe.image.name
+        recipe.image = image_file('blue')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        self.assertNotEqual(recipe.image.name, old_name)
+        self.assertEqual(self.references(recipe.image.name), 1)
+        self.assertIsNone(self.references(old_name))
+        self.assertFalse(recipe.image.storage.exists(old_name))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, MEDIA_ROOT=MEDIA_ROOT)
+class RecipePartialUpdateTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+        cls.flour, cls.sugar, cls.eggs = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Мука', 'Сахар', 'Яйца')
+        ]
+        cls.tag = Tag.objects.create(
+            name='Выпечка', color='#000000', slug='bakery'
+        )
+        image = stored_image()
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Пирог', text='Текст', cooking_time=10,
+            image=image, image_variants={'source': image},
+        )
+        cls.recipe.tags.set([cls.tag])
+        IngredientInRecipesAmount.objects.bulk_create([
+            IngredientInRecipesAmount(
+                recipe=cls.recipe, ingredient=cls.flour, amount=200
+            ),
+            IngredientInRecipesAmount(
+                recipe=cls.recipe, ingredient=cls.sugar, amount=50
+            ),
+        ])
+        ShoppingCart.objects.add(cls.reader, [cls.recipe.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.author)
+
+    def patch(self, data):
+        return self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/', data, format='json'
+        )
+
+    def amounts(self):
+        return {
+            amount.ingredient_id: (amount.pk, amount.amount)
+            for amount in IngredientInRecipesAmount.objects.filter(
+                recipe=self.recipe
+            )
+        }
+
+    def test_ingredients_are_updated_by_diff(self):
+        before = self.amounts()
+        response = self.patch({'ingredients': [
+            {'id': self.flour.pk, 'amount': 200},
+            {'id': self.eggs.pk, 'amount': 3},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        after = self.amounts()
+        self.assertEqual(after.keys(), {self.flour.pk, self.eggs.pk})
+        self.assertEqual(after[self.flour.pk], before[self.flour.pk])
+        self.assertEqual(after[self.eggs.pk][1], 3)
+        self.assertEqual(
+            dict(ShoppingListIngredient.objects.filter(
+                user=self.reader
+            ).values_list('ingredient__name', 'total_amount')),
+            {'Мука': 200, 'Яйца': 3},
+        )
+
+    def test_changed_amount_keeps_the_row(self):
+        before = self.amounts()
+        response = self.patch({'ingredients': [
+            {'id': self.flour.pk, 'amount': 300},
+            {'id': self.sugar.pk, 'amount': 50},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.amounts(), {
+            self.flour.pk: (before[self.flour.pk][0], 300),
+            self.sugar.pk: before[self.sugar.pk],
+        })
+
+    def test_omitted_fields_are_kept(self):
+        before = self.amounts()
+        response = self.patch({'name': 'Шарлотка'})
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Шарлотка')
+        self.assertEqual(self.amounts(), before)
+        self.assertEqual(list(self.recipe.tags.all()), [self.tag])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, MEDIA_ROOT=MEDIA_ROOT)
+class BatchToggleTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+        image = stored_image()
+        cls.recipe_ids = [
+            Recipe.objects.create(
+                author=cls.reader, name=f'Рецепт {number}', text='Текст',
+                cooking_time=10, image=image, image_variants={'source': image},
+            ).pk
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+
+    def counters(self, field):
+        return list(Recipe.objects.filter(
+            pk__in=self.recipe_ids
+        ).order_by('pk').values_list(field, flat=True))
+
+    def assert_idempotent(self, path, model, field):
+        first, second, third = self.recipe_ids
+        response = self.client.post(
+            path, {'recipes': [first, second]}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(response.data['added']), [first, second])
+        response = self.client.post(
+            path, {'recipes': [first, second, third]}, format='json'
+        )
+        self.assertEqual(response.data['added'], [third])
+        self.assertEqual(self.counters(field), [1, 1, 1])
+        self.assertEqual(model.objects.filter(user=self.reader).count(), 3)
+        response = self.client.delete(
+            path, {'recipes': [first, third]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.data['removed']), [first, third])
+        response = self.client.delete(
+            path, {'recipes': [first, third]}, format='json'
+        )
+        self.assertEqual(response.data['removed'], [])
+        self.assertEqual(self.counters(field), [0, 1, 0])
+
+    def test_favorite_batch_is_idempotent(self):
+        self.assert_idempotent(
+            '/api/recipes/favorite/', FavoriteReceipe, 'favorites_count'
+        )
+
+    def test_shopping_cart_batch_is_idempotent(self):
+        self.assert_idempotent(
+            '/api/recipes/shopping_cart/', ShoppingCart, 'in_carts_count'
+        )
+
+    def test_batch_size_is_limited(self):
+        response = self.client.post(
+            '/api/recipes/favorite/',
+            {'recipes': list(range(1, settings.RECIPE_BATCH_MAX_SIZE + 2))},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(FavoriteReceipe.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, MEDIA_ROOT=MEDIA_ROOT)
+class CursorPaginationTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        image = stored_image()
+        for number in range(5):
+            Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=10, image=image, image_variants={'source': image},
+            )
+        cls.recipe_ids = list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True))
+
+    def setUp(self):
+        cache.clear()
+
+    def page(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return (
+            [recipe['id'] for recipe in response.data['results']],
+            response.data['next'],
+            response.data['previous'],
+        )
+
+    def test_next_and_previous_links(self):
+        first, next_url, previous_url = self.page(
+            '/api/recipes/', {'cursor': '', 'limit': 2}
+        )
+        self.assertEqual(first, self.recipe_ids[:2])
+        self.assertIsNone(previous_url)
+        second, next_url, previous_url = self.page(next_url)
+        self.assertEqual(second, self.recipe_ids[2:4])
+        third, last_url, third_previous = self.page(next_url)
+        self.assertEqual(third, self.recipe_ids[4:])
+        self.assertIsNone(last_url)
+        self.assertEqual(self.page(third_previous)[0], second)
+        self.assertEqual(self.page(previous_url)[0], first)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/api/recipes/', {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 404)
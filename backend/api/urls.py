@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import async_read_view
+from .metrics import metrics_view
 from .views import IngredientsViewSet, RecipeViewSet, TagsViewSet, UsersViewSet
 
 app_name = 'api'
@@ -11,7 +14,18 @@ router.register('users', UsersViewSet, basename='users')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('ingredients', IngredientsViewSet, basename='ingredients')
 
+ASYNC_READ_ROUTES = (
+    'recipes-list', 'recipes-detail', 'tags-list', 'tags-detail',
+    'ingredients-list', 'ingredients-detail', 'users-subscriptions',
+)
+
+if settings.ASYNC_READ_VIEWS:
+    for pattern in router.urls:
+        if pattern.name in ASYNC_READ_ROUTES:
+            pattern.callback = async_read_view(pattern.callback)
+
 urlpatterns = [
+    path('_metrics', metrics_view, name='metrics'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
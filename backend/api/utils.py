@@ -1,19 +1,157 @@
-from django.shortcuts import HttpResponse
+import csv
+import hashlib
+import io
+from collections import defaultdict
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
 
-def shopping_cart_file(ingredients):
+from foodgram.cache import get_versions
+from .replicas import primary_reads
+from recipes.models import Recipe, ShoppingCart
 
-    shopping_list = 'Список покупок: \n'
-    for ingredient in ingredients:
-        shopping_list += (
+SHOPPING_CART_TITLE = 'Список покупок:'
+PDF_FONT = 'ShoppingCartFont'
+
+
+class Echo:
+
+    def write(self, value):
+        return value
+
+
+def shopping_cart_txt(ingredients):
+    yield f'{SHOPPING_CART_TITLE} \n'.encode()
+    for ingredient in ingredients.iterator():
+        yield (
             f'{ingredient["ingredient__name"]} - '
             f'{ingredient["amount_sum"]} '
             f'({ingredient["ingredient__measurement_unit"]}) \n'
+        ).encode()
+
+
+def shopping_cart_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield '\ufeff'.encode() + writer.writerow(
+        ('Ингредиент', 'Количество', 'Единица измерения')
+    ).encode()
+    for ingredient in ingredients.iterator():
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['amount_sum'],
+            ingredient['ingredient__measurement_unit'],
+        )).encode()
+
+
+def shopping_cart_pdf(ingredients):
+    if PDF_FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT, settings.SHOPPING_CART_PDF_FONT)
         )
-        response = HttpResponse(
-            shopping_list, content_type='text/plain; charset=utf8'
-        )
-        response[
-            'Content-Disposition'
-        ] = 'attachment; filename="shopping_cart.txt"'
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    margin = 50
+    pdf.setFont(PDF_FONT, 16)
+    pdf.drawString(margin, height - margin, SHOPPING_CART_TITLE)
+    pdf.setFont(PDF_FONT, 12)
+    y = height - margin - 30
+    for ingredient in ingredients.iterator():
+        if y < margin:
+            pdf.showPage()
+            pdf.setFont(PDF_FONT, 12)
+            y = height - margin
+        pdf.drawString(margin, y, (
+            f'{ingredient["ingredient__name"]} - '
+            f'{ingredient["amount_sum"]} '
+            f'({ingredient["ingredient__measurement_unit"]})'
+        ))
+        y -= 20
+    pdf.save()
+    yield buffer.getvalue()
+
+
+SHOPPING_CART_FORMATS = {
+    'txt': shopping_cart_txt,
+    'csv': shopping_cart_csv,
+    'pdf': shopping_cart_pdf,
+}
+
+
+def get_shopping_cart_version(user):
+    recipe_ids = ShoppingCart.objects.filter(user=user).order_by(
+        'recipe_id'
+    ).values_list('recipe_id', flat=True)
+    versions = get_versions(
+        ['ingredients', *(f'recipe:{pk}' for pk in recipe_ids)]
+    )
+    return hashlib.sha1(
+        repr(sorted(versions.items())).encode()
+    ).hexdigest()
+
+
+def cache_chunks(chunks, cache_key):
+    content = []
+    for chunk in chunks:
+        content.append(chunk)
+        yield chunk
+    cache.set(
+        cache_key, b''.join(content), settings.SHOPPING_CART_CACHE_TIMEOUT
+    )
+
+
+def shopping_cart_file(user, ingredients, renderer):
+    file_format = renderer.format
+    with primary_reads():
+        version = get_shopping_cart_version(user)
+    cache_key = f'shopping_cart:{user.id}:{file_format}:{version}'
+    content = cache.get(cache_key)
+    if content is None:
+        chunks = SHOPPING_CART_FORMATS[file_format](ingredients)
+        if settings.SHOPPING_CART_STREAMING:
+            streaming_content = cache_chunks(chunks, cache_key)
+        else:
+            with primary_reads():
+                content = b''.join(chunks)
+            cache.set(
+                cache_key, content, settings.SHOPPING_CART_CACHE_TIMEOUT
+            )
+    if content is not None:
+        streaming_content = (content,)
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f'{content_type}; charset={renderer.charset}'
+    response = StreamingHttpResponse(
+        streaming_content, content_type=content_type
+    )
+    response[
+        'Content-Disposition'
+    ] = f'attachment; filename="shopping_cart.{file_format}"'
     return response
+
+
+def get_recipes_by_author(author_ids, limit=None):
+    recipes = Recipe.objects.filter(author__in=author_ids)
+    if limit is not None:
+        recipes = recipes.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author')],
+            order_by=[F('pub_date').desc(), F('id').desc()],
+        ))
+        sql, params = recipes.query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+            f'ORDER BY pub_date DESC, id DESC',
+            (*params, limit),
+        )
+    recipes_by_author = defaultdict(list)
+    for recipe in recipes:
+        recipes_by_author[recipe.author_id].append(recipe)
+    return recipes_by_author
@@ -1,4 +1,4 @@
-from django.db.models import Sum
+from django.db.models import Exists, F, OuterRef
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
@@ -7,50 +7,94 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from recipes.models import (FavoriteReceipe, Ingredient,
-                            IngredientInRecipesAmount, Recipe, ShoppingCart,
-                            Tag)
+from recipes.feed import get_feed_querysets
+from recipes.models import (FavoriteReceipe, Ingredient, Recipe, ShoppingCart,
+                            ShoppingListIngredient, Tag)
 from users.models import Follow, User
-from .filters import RecipeFilter, IngredientFilter
-from .pagination import LimitPaginator
+from .cache import AnonymousResponseCacheMixin
+from .filters import COUNTER_ORDERINGS, RecipeFilter
+from .ingredient_index import ingredient_index
+from .metrics import SerializeTimingMixin
+from .pagination import (EstimatedCountPaginator, FeedPaginator,
+                         SubscriptionsPaginator)
+from .payloads import ingredients_payload, tags_payload
 from .permission import OwnerOrReadOnly
+from .renderers import (ShoppingCartCSVRenderer, ShoppingCartPDFRenderer,
+                        ShoppingCartTxtRenderer)
+from .replicas import ReplicaReadsMixin
 from .serializers import (FollowSerializer, IngredientSerializer,
-                          RecipesReadSerializer, RecipesWriteSerializer,
+                          RecipeIdsSerializer, RecipesReadSerializer,
+                          RecipesWriteSerializer,
                           ShoppingListFavoiriteSerializer, TagSerializer,
                           UserSerializer)
-from .utils import shopping_cart_file
+from .utils import get_recipes_by_author, shopping_cart_file
 
 
-class TagsViewSet(viewsets.ModelViewSet):
+class TagsViewSet(ReplicaReadsMixin, SerializeTimingMixin,
+                  viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
+    def list(self, request, *args, **kwargs):
+        return tags_payload.response(request)
 
-class IngredientsViewSet(viewsets.ModelViewSet):
+
+class IngredientsViewSet(ReplicaReadsMixin, SerializeTimingMixin,
+                         viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = [IngredientFilter]
-    search_fields = ('^name', )
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return ingredients_payload.response(request)
+        limit = request.query_params.get('limit', '')
+        return Response(ingredient_index.get().search(
+            name, int(limit) if limit.isdigit() else None
+        ))
 
 
-class UsersViewSet(UserViewSet):
+class UsersViewSet(ReplicaReadsMixin, SerializeTimingMixin, UserViewSet):
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    cursor_ordering = ('-id',)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.query_params.get('ordering') == 'popular':
+            queryset = queryset.order_by('-followers_count', '-id')
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))
+            )
+        )
 
     @action(
         methods=['GET'], detail=False,
         permission_classes=(IsAuthenticated,),
-        pagination_class=LimitPaginator,
+        pagination_class=SubscriptionsPaginator,
     )
     def subscriptions(self, request):
         user = self.request.user
-        queryset = Follow.objects.filter(user=user)
+        queryset = Follow.objects.filter(user=user).select_related(
+            'author'
+        ).order_by('-id')
         page = self.paginate_queryset(queryset)
+        recipes_limit = request.query_params.get('recipes_limit', '')
+        recipes_by_author = get_recipes_by_author(
+            [follow.author_id for follow in page],
+            int(recipes_limit) if recipes_limit.isdigit() else None,
+        )
+        for follow in page:
+            follow.author_recipes = recipes_by_author[follow.author_id]
         serializer = FollowSerializer(
             page, many=True, context={'request': request}
         )
-        return self.get_paginated_response(serializer.data)
+        return self.get_paginated_response(self.serialize(serializer))
 
     @action(
         methods=['POST', 'DELETE'], detail=True,
@@ -65,56 +109,116 @@ class UsersViewSet(UserViewSet):
                 context={'request': request},
             )
             return Response(
-                serializer.data, status=status.HTTP_201_CREATED
+                self.serialize(serializer), status=status.HTTP_201_CREATED
             )
         Follow.objects.filter(user=user, author=author).delete()
         return Response('Успешная отписка', status=status.HTTP_204_NO_CONTENT)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, ReplicaReadsMixin,
+                    SerializeTimingMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
     permission_class = (OwnerOrReadOnly,)
-    pagination_class = LimitPaginator
+    pagination_class = EstimatedCountPaginator
+    lookup_value_regex = r'\d+'
+    count_cache_version = 'recipes'
+    count_cache_params = ('tags', 'author', 'ordering')
+    response_cache_params = (
+        'tags', 'author', 'ordering', 'limit', 'page', 'cursor'
+    )
+    response_cache_list_params = ('tags',)
+
+    def get_queryset(self):
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'recipe__ingredient'
+        )
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(FavoriteReceipe.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        )
+
+    def list(self, request, *args, **kwargs):
+        version_names = ['recipes', 'ingredients']
+        if request.query_params.get('ordering') in COUNTER_ORDERINGS:
+            version_names.append('recipes:counters')
+        return self.cached_response(
+            version_names, super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            ('recipes', 'ingredients', f'recipe:{kwargs["pk"]}'),
+            super().retrieve, request, *args, **kwargs
+        )
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipesReadSerializer
         return RecipesWriteSerializer
 
+    @action(
+        methods=['GET'], detail=False,
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPaginator,
+    )
+    def feed(self, request):
+        page = self.paginate_queryset(
+            get_feed_querysets(request.user, self.get_queryset())
+        )
+        serializer = RecipesReadSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(self.serialize(serializer))
+
     def post_delete_recipe(self, request, pk, model):
-        recipe = get_object_or_404(Recipe, pk=pk)
         user = self.request.user
         if request.method == 'POST':
-            serializer = ShoppingListFavoiriteSerializer(recipe)
-            if model.objects.filter(
-                    user=user, recipe=recipe
-            ).exists():
+            if not model.objects.add(user, [pk]):
+                get_object_or_404(Recipe, pk=pk)
                 return Response(
                     {'errors': 'Рецепт уже добавлен!'},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            else:
-                model.objects.create(
-                    user=user, recipe=recipe
-                )
-                return Response(
-                    serializer.data,
-                    status=status.HTTP_201_CREATED)
-        elif request.method == 'DELETE':
-            if model.objects.filter(
-                user=user, recipe=recipe
-            ).exists():
-                model.objects.get(
-                    user=user, recipe=recipe
-                ).delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            else:
-                return Response(
-                    {'errors': 'Рецепт уже удален!'},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+            serializer = ShoppingListFavoiriteSerializer(
+                Recipe.objects.only(
+                    'id', 'name', 'image', 'image_variants', 'cooking_time'
+                ).get(pk=pk)
+            )
+            return Response(
+                self.serialize(serializer),
+                status=status.HTTP_201_CREATED)
+        if model.objects.remove(user, [pk]):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe, pk=pk)
+        return Response(
+            {'errors': 'Рецепт уже удален!'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    def post_delete_recipes(self, request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            return Response(
+                {'added': model.objects.add(request.user, recipe_ids)},
+                status=status.HTTP_201_CREATED,
+            )
+        return Response(
+            {'removed': model.objects.remove(request.user, recipe_ids)}
+        )
 
     @action(
         methods=['POST', 'DELETE'], detail=True,
@@ -131,20 +235,36 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self.post_delete_recipe(
             request, kwargs.pop('pk'), ShoppingCart)
 
+    @action(
+        methods=['POST', 'DELETE'], detail=False, url_path='favorite',
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_batch(self, request):
+        return self.post_delete_recipes(request, FavoriteReceipe)
+
+    @action(
+        methods=['POST', 'DELETE'], detail=False, url_path='shopping_cart',
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_batch(self, request):
+        return self.post_delete_recipes(request, ShoppingCart)
+
     @action(
         methods=['GET'], detail=False,
-        permission_class=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            ShoppingCartTxtRenderer,
+            ShoppingCartCSVRenderer,
+            ShoppingCartPDFRenderer,
+        ),
     )
     def download_shopping_cart(self, request):
-        ingredients = IngredientInRecipesAmount.objects.select_related(
-            'recipe', 'ingredient'
-        )
-        ingredients = ingredients.filter(
-            recipe__shopping_recipes__user=request.user
-        )
-        ingredients = ingredients.values(
-            'ingredient__name', 'ingredient__measurement_unit'
+        ingredients = ShoppingListIngredient.objects.filter(
+            user=request.user
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit',
+            amount_sum=F('total_amount'),
+        ).order_by('ingredient__name')
+        return shopping_cart_file(
+            request.user, ingredients, request.accepted_renderer
         )
-        ingredients = ingredients.annotate(amount_sum=Sum('amount'))
-        ingredients = ingredients.order_by('ingredient__name')
-        return shopping_cart_file(ingredients)
@@ -0,0 +1,40 @@
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+
+VERSION_CACHE = 'versions'
+VERSION_KEY = 'version:{}'
+
+
+def get_version(name):
+    return get_versions([name])[name]
+
+
+def get_versions(names):
+    cache = caches[VERSION_CACHE]
+    keys = {VERSION_KEY.format(name): name for name in names}
+    versions = cache.get_many(keys)
+    seeds = {
+        key: time.time_ns() for key in keys if key not in versions
+    }
+    if seeds:
+        for key, seed in seeds.items():
+            cache.add(key, seed, None)
+        seeds.update(cache.get_many(seeds))
+        versions.update(seeds)
+    return {name: versions[key] for key, name in keys.items()}
+
+
+def bump_version(name):
+    key = VERSION_KEY.format(name)
+
+    def bump():
+        cache = caches[VERSION_CACHE]
+        cache.add(key, time.time_ns(), None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+    transaction.on_commit(bump)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import find_dotenv, load_dotenv
@@ -12,7 +13,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ.get('SECRET_KEY')
 
 
-DEBUG = True
+DEBUG = os.getenv('DEBUG', default='False') == 'True'
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '51.250.111.89', 'backend']
 
@@ -23,6 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -33,6 +35,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,6 +84,47 @@ else:
         }
     }
 
+DB_REPLICA_HOSTS = [
+    host for host in os.getenv('DB_REPLICA_HOSTS', default='').split(',')
+    if host
+]
+for number, address in enumerate(DB_REPLICA_HOSTS):
+    host, _, port = address.partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default'].get('PORT', ''),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_REPLICA_PIN_SECONDS = int(
+    os.getenv('DB_REPLICA_PIN_SECONDS', default=10)
+)
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND',
+    default='django.core.cache.backends.filebased.FileBasedCache'
+)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+        ),
+    },
+    'versions': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv(
+            'VERSION_CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'foodgram_versions')
+        ),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 10 ** 9},
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -119,7 +163,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend",
@@ -145,3 +189,48 @@ DJOSER = {
 }
 
 MIN_VALIDATE_VALUE = 1
+RECIPE_BATCH_MAX_SIZE = 100
+
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60 * 24
+SHOPPING_LIST_REFRESH_BATCH_SIZE = 500
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+INGREDIENT_INDEX_TIMEOUT = 60 * 5
+INGREDIENT_SEARCH_FUZZY_MIN_LENGTH = 4
+
+# recipes.0010 builds recipe_search_vector_idx with this config; rebuild
+# the index after changing it.
+RECIPE_SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_SHORT_QUERY_LENGTH = 5
+
+METRICS_ALLOWED_IPS = os.getenv(
+    'METRICS_ALLOWED_IPS', default='127.0.0.1'
+).split(',')
+
+RESPONSE_CACHE_ENABLED = (
+    os.getenv('RESPONSE_CACHE_ENABLED', default='False') == 'True'
+)
+RESPONSE_CACHE_TIMEOUT = 60 * 10
+
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TIMEOUT = 60 * 5
+
+SERVER_MODE = os.getenv('SERVER_MODE', default='wsgi')
+ASYNC_READ_VIEWS = SERVER_MODE == 'asgi'
+SHOPPING_CART_STREAMING = SERVER_MODE == 'wsgi'
+
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = 10000
+PAGINATION_COUNT_CACHE_TIMEOUT = 60 * 5
+
+RECIPE_IMAGE_SIZES = (240, 480, 960)
+RECIPE_IMAGE_VARIANTS_DIR = 'recipes/variants'
+RECIPE_IMAGE_WORKERS = 2
+
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_BACKFILL_LIMIT = 100
+FEED_BATCH_SIZE = 1000
+FEED_PULL_AUTHORS_TIMEOUT = 60 * 5
+FEED_FANOUT_WORKERS = 2
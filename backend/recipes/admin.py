@@ -1,5 +1,8 @@
 from django.contrib import admin
 
+from api.filters import RecipeFilter
+from api.ingredient_index import ingredient_index
+from api.pagination import EstimatedCountDjangoPaginator
 from .models import (FavoriteReceipe, Ingredient, IngredientInRecipesAmount,
                      Recipe, ShoppingCart, Tag)
 
@@ -10,8 +13,19 @@ class IngredientAdmin(admin.ModelAdmin):
         'name',
         'measurement_unit',
     )
-    list_filter = ('name',)
+    search_fields = ('name', )
     ordering = ('name', )
+    paginator = EstimatedCountDjangoPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        ids = [
+            ingredient['id']
+            for ingredient in ingredient_index.get().search(search_term)
+        ]
+        return queryset.filter(pk__in=ids), False
 
 
 @admin.register(Tag)
@@ -21,15 +35,21 @@ class TagAdmin(admin.ModelAdmin):
         'color',
     )
     list_filter = ('name',)
+    search_fields = ('name', 'slug')
 
 
 @admin.register(IngredientInRecipesAmount)
 class AmountIngredientAdmin(admin.ModelAdmin):
     list_display = ('amount', 'ingredient', 'recipe')
+    list_select_related = ('ingredient', 'recipe')
+    autocomplete_fields = ('ingredient', 'recipe')
+    paginator = EstimatedCountDjangoPaginator
+    show_full_result_count = False
 
 
 class IngredientInRecipesAmountInline(admin.TabularInline):
     model = IngredientInRecipesAmount
+    autocomplete_fields = ('ingredient',)
     extra = 1
     min_num = 1
 
@@ -37,26 +57,44 @@ class IngredientInRecipesAmountInline(admin.TabularInline):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('name', 'author', 'get_in_favorites')
-    list_filter = (
-        'name',
-        'author',
-        'tags',
-    )
+    list_select_related = ('author',)
+    list_filter = ('tags',)
+    search_fields = ('name', )
+    autocomplete_fields = ('author', 'tags')
     inlines = (IngredientInRecipesAmountInline,)
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountDjangoPaginator
+    show_full_result_count = False
 
+    @admin.display(description='В избранном', ordering='favorites_count')
     def get_in_favorites(self, obj):
-        return obj.favorite_recipes.count()
+        return obj.favorites_count
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return RecipeFilter().search_filter(
+            queryset, 'search', search_term
+        ), False
 
 
 @admin.register(FavoriteReceipe)
 class FavoriteReceipeAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe',)
-    list_filter = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    search_fields = ('user__email__startswith', )
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountDjangoPaginator
+    show_full_result_count = False
 
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe', )
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    search_fields = ('user__email__startswith', )
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountDjangoPaginator
+    show_full_result_count = False
@@ -0,0 +1,124 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+from django.db.models import F
+
+from users.models import Follow, User
+from .models import FeedEntry, Recipe
+
+logger = logging.getLogger(__name__)
+
+PULL_AUTHORS_CACHE_KEY = 'feed:pull_authors'
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.FEED_FANOUT_WORKERS,
+    thread_name_prefix='recipe-feed',
+)
+
+
+def get_pull_author_ids():
+    author_ids = cache.get(PULL_AUTHORS_CACHE_KEY)
+    if author_ids is None:
+        author_ids = list(User.objects.filter(
+            followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+        ).values_list('pk', flat=True))
+        cache.set(
+            PULL_AUTHORS_CACHE_KEY, author_ids,
+            settings.FEED_PULL_AUTHORS_TIMEOUT,
+        )
+    return set(author_ids)
+
+
+def fan_out(recipe_id, author_id):
+    if author_id in get_pull_author_ids():
+        return
+    connection = connections[router.db_for_write(FeedEntry)]
+    quote_name = connection.ops.quote_name
+    feed = FeedEntry._meta
+    follow = Follow._meta
+    recipe = Recipe._meta
+    sql = (
+        'INSERT INTO {feed} ({feed_user}, {feed_recipe}, {feed_pub_date}) '
+        'SELECT {follow}.{follow_user}, {recipe}.{recipe_pk}, '
+        '{recipe}.{recipe_pub_date} '
+        'FROM {follow} INNER JOIN {recipe} '
+        'ON {recipe}.{recipe_author} = {follow}.{follow_author} '
+        'WHERE {recipe}.{recipe_pk} = %s '
+        'ON CONFLICT DO NOTHING'
+    ).format(
+        feed=quote_name(feed.db_table),
+        feed_user=quote_name(feed.get_field('user').column),
+        feed_recipe=quote_name(feed.get_field('recipe').column),
+        feed_pub_date=quote_name(feed.get_field('pub_date').column),
+        follow=quote_name(follow.db_table),
+        follow_user=quote_name(follow.get_field('user').column),
+        follow_author=quote_name(follow.get_field('author').column),
+        recipe=quote_name(recipe.db_table),
+        recipe_pk=quote_name(recipe.pk.column),
+        recipe_pub_date=quote_name(recipe.get_field('pub_date').column),
+        recipe_author=quote_name(recipe.get_field('author').column),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [recipe_id])
+
+
+def fan_out_in_worker(recipe_id, author_id):
+    try:
+        fan_out(recipe_id, author_id)
+    except Exception:
+        logger.exception(
+            'Не удалось разослать рецепт %s подписчикам', recipe_id
+        )
+    finally:
+        connections.close_all()
+
+
+def schedule_fan_out(recipe_id, author_id):
+    return executor.submit(fan_out_in_worker, recipe_id, author_id)
+
+
+def backfill(user_id, author_id):
+    if author_id in get_pull_author_ids():
+        return
+    recipes = Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:settings.FEED_BACKFILL_LIMIT]
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for recipe_id, pub_date in recipes
+        ],
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def get_feed_querysets(user, queryset):
+    querysets = [
+        queryset.filter(feed_entries__user=user).annotate(
+            feed_pub_date=F('feed_entries__pub_date'),
+            feed_recipe_id=F('feed_entries__recipe_id'),
+        )
+    ]
+    pull_author_ids = get_pull_author_ids()
+    if pull_author_ids:
+        author_ids = list(Follow.objects.filter(
+            user=user, author_id__in=pull_author_ids
+        ).values_list('author_id', flat=True))
+        if author_ids:
+            querysets.append(queryset.filter(
+                author_id__in=author_ids
+            ).annotate(
+                feed_pub_date=F('pub_date'),
+                feed_recipe_id=F('id'),
+            ))
+    return querysets
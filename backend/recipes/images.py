@@ -0,0 +1,103 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, router, transaction
+from PIL import Image
+
+from foodgram.cache import bump_version
+from .models import ImageBlob, Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMATS = {
+    'jpeg': ('JPEG', 'jpg'),
+    'webp': ('WEBP', 'webp'),
+}
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.RECIPE_IMAGE_WORKERS,
+    thread_name_prefix='recipe-images',
+)
+
+
+def variant_name(name, width, extension):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{settings.RECIPE_IMAGE_VARIANTS_DIR}/{stem}_{width}.{extension}'
+
+
+def build_variants(name, storage):
+    with storage.open(name) as file:
+        image = Image.open(file)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    opaque = image
+    if image.mode == 'RGBA':
+        opaque = Image.new('RGB', image.size, 'white')
+        opaque.paste(image, mask=image.getchannel('A'))
+    widths = [
+        width for width in settings.RECIPE_IMAGE_SIZES if width < image.width
+    ] or [image.width]
+    variants = {'source': name}
+    for key, (image_format, extension) in VARIANT_FORMATS.items():
+        source = opaque if image_format == 'JPEG' else image
+        variants[key] = {}
+        for width in widths:
+            resized = source.resize(
+                (width, max(1, round(image.height * width / image.width))),
+                Image.LANCZOS,
+            )
+            buffer = BytesIO()
+            resized.save(buffer, image_format, quality=85)
+            variants[key][str(width)] = storage.save(
+                variant_name(name, width, extension),
+                ContentFile(buffer.getvalue()),
+            )
+    return variants
+
+
+def generate_variants(recipe_id):
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+        if recipe is None or not recipe.image:
+            return
+        updated = Recipe.objects.filter(
+            pk=recipe_id, image=recipe.image.name
+        ).update(image_variants=build_variants(
+            recipe.image.name, recipe.image.storage
+        ))
+        if updated:
+            bump_version(f'recipe:{recipe_id}')
+            bump_version('recipes')
+    except Exception:
+        logger.exception(
+            'Не удалось подготовить изображения рецепта %s', recipe_id
+        )
+
+
+def generate_variants_in_worker(recipe_id):
+    try:
+        generate_variants(recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_variants(recipe_id):
+    return executor.submit(generate_variants_in_worker, recipe_id)
+
+
+def release_image(name, variants, storage):
+    if not name:
+        return
+    with transaction.atomic(using=router.db_for_write(ImageBlob)):
+        if not ImageBlob.objects.release(name):
+            return
+        for path in [name, *(
+            path for image_format in VARIANT_FORMATS
+            for path in variants.get(image_format, {}).values()
+        )]:
+            storage.delete(path)
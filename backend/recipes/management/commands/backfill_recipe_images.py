@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Готовит уменьшенные копии фотографий для уже созданных рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Проверить копии для всех рецептов, а не только новых.',
+        )
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').order_by('pk')
+        processed = 0
+        last_pk = 0
+        while True:
+            batch = list(recipes.filter(pk__gt=last_pk).values_list(
+                'pk', 'image', 'image_variants'
+            )[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            for pk, image, variants in batch:
+                if options['all'] or variants.get('source') != image:
+                    generate_variants(pk)
+                    processed += 1
+        self.stdout.write(f'Обработано рецептов: {processed}')
@@ -1,25 +1,93 @@
 import csv
+import json
+import os
 
-from django.core.management.base import BaseCommand
-from django.db import IntegrityError
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from foodgram.cache import bump_version
 from recipes.models import Ingredient
 
+DEFAULT_PATH = os.path.join(
+    settings.BASE_DIR, 'recipes', 'data', 'ingredients.csv'
+)
+MAX_LENGTH = 200
+
 
 class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из CSV или JSON пачками, '
+        'пропуская уже существующие.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+        parser.add_argument(
+            '--format', choices=('csv', 'json'),
+            help='Формат файла, по умолчанию определяется по расширению.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Показать, что будет добавлено, ничего не записывая.',
+        )
+
+    def read_rows(self, path, file_format):
+        with open(path, encoding='utf-8') as file:
+            if file_format == 'json':
+                for item in json.load(file):
+                    yield item.get('name'), item.get('measurement_unit')
+                return
+            for row in csv.reader(file):
+                yield tuple(row) if len(row) == 2 else (None, None)
 
     def handle(self, *args, **options):
-        file_name = 'recipes/data/ingredients.csv'
-        with open(file_name, 'r', encoding='utf-8') as file:
-            print(file)
-            file_reader = csv.reader(file)
-            for row in file_reader:
-                name, measurement_unit = row
-                try:
-                    Ingredient.objects.get_or_create(
-                        name=name,
-                        measurement_unit=measurement_unit
-                    )
-                except IntegrityError:
-                    print(f'Ингредиент {name} {measurement_unit}'
-                          f' есть в базе')
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(
+            path
+        )[1].lstrip('.').lower()
+        if file_format not in ('csv', 'json'):
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        try:
+            rows = list(self.read_rows(path, file_format))
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        existing = set(Ingredient.objects.values_list(
+            'name', 'measurement_unit'
+        ).iterator())
+        new, seen = [], set()
+        skipped = invalid = 0
+        for name, measurement_unit in rows:
+            if not isinstance(name, str) or not isinstance(
+                measurement_unit, str
+            ):
+                invalid += 1
+                continue
+            key = (name.strip(), measurement_unit.strip())
+            if not all(key) or max(map(len, key)) > MAX_LENGTH:
+                invalid += 1
+            elif key in existing or key in seen:
+                skipped += 1
+            else:
+                seen.add(key)
+                new.append(key)
+        if options['dry_run']:
+            for name, measurement_unit in new:
+                self.stdout.write(f'+ {name}, {measurement_unit}')
+        else:
+            with transaction.atomic():
+                Ingredient.objects.bulk_create(
+                    [
+                        Ingredient(name=name, measurement_unit=unit)
+                        for name, unit in new
+                    ],
+                    batch_size=options['batch_size'],
+                    ignore_conflicts=True,
+                )
+                bump_version('ingredients')
+        added = 'Будет добавлено' if options['dry_run'] else 'Добавлено'
+        self.stdout.write(
+            f'{added}: {len(new)}, уже в базе или повторяются: {skipped}, '
+            f'с ошибками: {invalid}'
+        )
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingCart, ShoppingListIngredient
+
+
+class Command(BaseCommand):
+    help = 'Проверяет и пересобирает агрегированные списки покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только найти расхождения, ничего не меняя.',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        user_ids = sorted(
+            set(ShoppingCart.objects.values_list('user_id', flat=True))
+            | set(ShoppingListIngredient.objects.values_list(
+                'user_id', flat=True
+            ))
+        )
+        batch_size = options['batch_size']
+        drifted_users = set()
+        drifted_rows = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            expected = {
+                (amount['user_id'], amount['ingredient_id']):
+                    amount['total_amount']
+                for amount in ShoppingListIngredient.objects.aggregate_amounts(
+                    batch
+                )
+            }
+            actual = {
+                (user_id, ingredient_id): total_amount
+                for user_id, ingredient_id, total_amount in
+                ShoppingListIngredient.objects.filter(
+                    user__in=batch
+                ).values_list('user_id', 'ingredient_id', 'total_amount')
+            }
+            drifted = {
+                key for key in expected.keys() | actual.keys()
+                if expected.get(key) != actual.get(key)
+            }
+            drifted_rows += len(drifted)
+            drifted_users.update(user_id for user_id, _ in drifted)
+            if not options['check']:
+                ShoppingListIngredient.objects.refresh(batch)
+        self.stdout.write(
+            f'Пользователей: {len(user_ids)}, '
+            f'с расхождениями: {len(drifted_users)}, '
+            f'расхождений: {drifted_rows}'
+        )
+        if options['check'] and drifted_rows:
+            raise CommandError('Списки покупок расходятся с корзинами.')
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoriteReceipe, Recipe, ShoppingCart
+from users.models import Follow, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', FavoriteReceipe, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def actual_count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Сверяет и исправляет денормализованные счётчики.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только найти расхождения, ничего не меняя.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total_drifted = 0
+        for model, counter, source, field in COUNTERS:
+            drifted = self.reconcile(
+                model, counter, actual_count(source, field),
+                options['batch_size'], options['check'],
+            )
+            total_drifted += drifted
+            self.stdout.write(
+                f'{model._meta.model_name}.{counter}: '
+                f'расхождений: {drifted}'
+            )
+        if options['check'] and total_drifted:
+            raise CommandError('Счётчики расходятся с данными.')
+
+    def reconcile(self, model, counter, actual, batch_size, check):
+        drifted = 0
+        last_pk = 0
+        while True:
+            pks = list(model.objects.filter(pk__gt=last_pk).order_by(
+                'pk'
+            ).values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return drifted
+            last_pk = pks[-1]
+            queryset = model.objects.filter(pk__in=pks).alias(
+                actual=actual
+            ).exclude(**{counter: F('actual')})
+            if check:
+                drifted += queryset.count()
+                continue
+            with transaction.atomic():
+                drifted += queryset.update(**{counter: actual})
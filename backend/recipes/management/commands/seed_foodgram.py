@@ -0,0 +1,300 @@
+import io
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from foodgram.cache import bump_version
+from recipes.models import (FavoriteReceipe, FeedEntry, ImageBlob, Ingredient,
+                            IngredientInRecipesAmount, Recipe, ShoppingCart,
+                            Tag)
+from users.models import Follow, User
+
+SEED_PREFIX = 'seed_'
+MEASUREMENT_UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.')
+
+
+def zipf_weights(size, skew):
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(size)))
+
+
+def weighted_sample(rng, population, cum_weights, k):
+    k = min(k, len(population) // 2 or len(population))
+    chosen = set()
+    while len(chosen) < k:
+        chosen.update(rng.choices(
+            population, cum_weights=cum_weights, k=k - len(chosen)
+        ))
+    return sorted(chosen)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт воспроизводимый набор тестовых данных: пользователей, '
+        'рецепты, подписки, избранное и корзины.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument('--ingredients', type=int, default=1000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, nargs=2, default=(3, 12),
+        )
+        parser.add_argument(
+            '--tags-per-recipe', type=int, nargs=2, default=(1, 3),
+        )
+        parser.add_argument('--follows', type=int, default=20)
+        parser.add_argument('--favorites', type=int, default=30)
+        parser.add_argument('--cart', type=int, default=5)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель распределения Ципфа для популярности.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить ранее созданные тестовые данные.',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.batch_size = options['batch_size']
+        seeded = User.objects.filter(username__startswith=SEED_PREFIX)
+        if seeded.exists():
+            if not options['clear']:
+                raise CommandError(
+                    'Тестовые данные уже есть, используйте --clear.'
+                )
+            self.step('Удаление старых данных', seeded.delete)
+        with transaction.atomic():
+            tag_ids = self.step('Тэги', self.create_tags)
+            ingredient_ids = self.step('Ингредиенты', self.create_ingredients)
+            user_ids = self.step('Пользователи', self.create_users)
+            recipes = self.step(
+                'Рецепты', self.create_recipes, user_ids, tag_ids,
+                ingredient_ids,
+            )
+            follows = self.step('Подписки', self.create_follows, user_ids)
+            self.step(
+                'Избранное и корзины', self.create_user_recipes,
+                user_ids, [recipe_id for recipe_id, _, _ in recipes],
+            )
+            self.step('Ленты', self.create_feeds, recipes, follows)
+        self.step(
+            'Счётчики', call_command, 'reconcile_counters',
+            stdout=io.StringIO(),
+        )
+        self.step(
+            'Списки покупок', call_command, 'rebuild_shopping_lists',
+            stdout=io.StringIO(),
+        )
+        for name in ('ingredients', 'recipes', 'tags'):
+            bump_version(name)
+
+    def step(self, title, function, *args, **kwargs):
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.stdout.write(
+            f'{title}: {time.perf_counter() - started:.1f} с'
+        )
+        return result
+
+    def create_tags(self):
+        Tag.objects.bulk_create(
+            [
+                Tag(
+                    name=f'Тэг {number}',
+                    color=f'#{self.rng.randrange(0x1000000):06X}',
+                    slug=f'tag-{number}',
+                )
+                for number in range(self.options['tags'])
+            ],
+            ignore_conflicts=True,
+        )
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def create_ingredients(self):
+        missing = self.options['ingredients'] - Ingredient.objects.count()
+        if missing > 0:
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(
+                        name=f'Ингредиент {SEED_PREFIX}{number}',
+                        measurement_unit=self.rng.choice(MEASUREMENT_UNITS),
+                    )
+                    for number in range(missing)
+                ],
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+        return list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+
+    def create_users(self):
+        password = make_password('seed-password')
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f'{SEED_PREFIX}{number}',
+                    email=f'{SEED_PREFIX}{number}@example.com',
+                    first_name=f'Имя {number}',
+                    last_name=f'Фамилия {number}',
+                    password=password,
+                )
+                for number in range(self.options['users'])
+            ],
+            batch_size=self.batch_size,
+        )
+        return list(User.objects.filter(
+            username__startswith=SEED_PREFIX
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_image(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (960, 640), (200, 120, 60)).save(buffer, 'JPEG')
+        storage = Recipe._meta.get_field('image').storage
+        return storage.save(
+            'recipes/seed.jpg', ContentFile(buffer.getvalue())
+        )
+
+    def create_recipes(self, user_ids, tag_ids, ingredient_ids):
+        rng = self.rng
+        image = self.create_image()
+        authors = rng.choices(
+            user_ids,
+            cum_weights=zipf_weights(len(user_ids), self.options['skew']),
+            k=self.options['recipes'],
+        )
+        now = timezone.now()
+        dates = [
+            now - timedelta(seconds=rng.randrange(
+                self.options['days'] * 24 * 60 * 60
+            ))
+            for _ in authors
+        ]
+        Recipe.objects.bulk_create(
+            [
+                Recipe(
+                    author_id=author_id,
+                    name=f'Рецепт {number}',
+                    text=f'Описание рецепта {number}. ' * 5,
+                    cooking_time=rng.randint(5, 180),
+                    image=image,
+                )
+                for number, author_id in enumerate(authors)
+            ],
+            batch_size=self.batch_size,
+        )
+        ImageBlob.objects.acquire(image, len(authors))
+        recipes = list(Recipe.objects.filter(
+            author_id__in=user_ids
+        ).order_by('id'))
+        for recipe, pub_date in zip(recipes, dates):
+            recipe.pub_date = pub_date
+        Recipe.objects.bulk_update(
+            recipes, ['pub_date'], batch_size=self.batch_size
+        )
+        tag_weights = zipf_weights(len(tag_ids), self.options['skew'])
+        ingredient_weights = zipf_weights(
+            len(ingredient_ids), self.options['skew']
+        )
+        recipe_tags = []
+        amounts = []
+        for recipe in recipes:
+            for tag_id in weighted_sample(
+                rng, tag_ids, tag_weights,
+                rng.randint(*self.options['tags_per_recipe']),
+            ):
+                recipe_tags.append(Recipe.tags.through(
+                    recipe_id=recipe.id, tag_id=tag_id
+                ))
+            for ingredient_id in weighted_sample(
+                rng, ingredient_ids, ingredient_weights,
+                rng.randint(*self.options['ingredients_per_recipe']),
+            ):
+                amounts.append(IngredientInRecipesAmount(
+                    recipe_id=recipe.id,
+                    ingredient_id=ingredient_id,
+                    amount=rng.randint(1, 500),
+                ))
+        Recipe.tags.through.objects.bulk_create(
+            recipe_tags, batch_size=self.batch_size
+        )
+        IngredientInRecipesAmount.objects.bulk_create(
+            amounts, batch_size=self.batch_size
+        )
+        return [
+            (recipe.id, recipe.author_id, recipe.pub_date)
+            for recipe in recipes
+        ]
+
+    def create_follows(self, user_ids):
+        rng = self.rng
+        weights = zipf_weights(len(user_ids), self.options['skew'])
+        follows = []
+        for user_id in user_ids:
+            count = rng.randint(0, 2 * self.options['follows'])
+            follows.extend(
+                Follow(user_id=user_id, author_id=author_id)
+                for author_id in weighted_sample(
+                    rng, user_ids, weights, count
+                )
+                if author_id != user_id
+            )
+        Follow.objects.bulk_create(follows, batch_size=self.batch_size)
+        return [(follow.user_id, follow.author_id) for follow in follows]
+
+    def create_user_recipes(self, user_ids, recipe_ids):
+        rng = self.rng
+        popularity = list(recipe_ids)
+        rng.shuffle(popularity)
+        weights = zipf_weights(len(popularity), self.options['skew'])
+        for model, average in (
+            (FavoriteReceipe, self.options['favorites']),
+            (ShoppingCart, self.options['cart']),
+        ):
+            model.objects.bulk_create(
+                [
+                    model(user_id=user_id, recipe_id=recipe_id)
+                    for user_id in user_ids
+                    for recipe_id in weighted_sample(
+                        rng, popularity, weights,
+                        rng.randint(0, 2 * average),
+                    )
+                ],
+                batch_size=self.batch_size,
+            )
+
+    def create_feeds(self, recipes, follows):
+        recipes_by_author = defaultdict(list)
+        for recipe_id, author_id, pub_date in sorted(
+            recipes, key=lambda recipe: recipe[2], reverse=True
+        ):
+            recipes_by_author[author_id].append((recipe_id, pub_date))
+        followers = defaultdict(int)
+        for _, author_id in follows:
+            followers[author_id] += 1
+        limit = settings.FEED_BACKFILL_LIMIT
+        entries = [
+            FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for user_id, author_id in follows
+            if followers[author_id] <= settings.FEED_FANOUT_MAX_FOLLOWERS
+            for recipe_id, pub_date in recipes_by_author[author_id][:limit]
+        ]
+        FeedEntry.objects.bulk_create(entries, batch_size=self.batch_size)
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def search_indexes():
+    config = settings.RECIPE_SEARCH_CONFIG
+    return (
+        GinIndex(
+            SearchVector('name', weight='A', config=config)
+            + SearchVector('text', weight='B', config=config),
+            name='recipe_search_vector_idx',
+        ),
+        GinIndex(
+            fields=['name'],
+            opclasses=['gin_trgm_ops'],
+            name='recipe_name_trgm_idx',
+        ),
+    )
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for index in search_indexes():
+        schema_editor.add_index(Recipe, index)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for index in search_indexes():
+        schema_editor.remove_index(Recipe, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_shoppinglistingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.2 on 2026-10-18 19:05
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+MERGED_MODELS = (
+    ('IngredientInRecipesAmount', 'recipe_id', 'amount'),
+    ('ShoppingListIngredient', 'user_id', 'total_amount'),
+)
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates:
+        extra_ids = list(Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=duplicate['keep_id']).values_list('id', flat=True))
+        for model_name, owner, amount in MERGED_MODELS:
+            model = apps.get_model('recipes', model_name)
+            for row in model.objects.filter(ingredient_id__in=extra_ids):
+                kept = model.objects.filter(
+                    ingredient_id=duplicate['keep_id'],
+                    **{owner: getattr(row, owner)},
+                ).first()
+                if kept is None:
+                    row.ingredient_id = duplicate['keep_id']
+                    row.save()
+                    continue
+                setattr(kept, amount, getattr(kept, amount) + getattr(
+                    row, amount
+                ))
+                kept.save()
+                row.delete()
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_measurement_unit'),
+        ),
+    ]
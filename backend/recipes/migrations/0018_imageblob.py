@@ -0,0 +1,38 @@
+# Generated by Django 3.2 on 2026-10-18 19:37
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_image_blobs(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    ImageBlob = apps.get_model('recipes', 'ImageBlob')
+    ImageBlob.objects.bulk_create(
+        ImageBlob(name=image, references_count=count)
+        for image, count in Recipe.objects.exclude(image='').order_by(
+        ).values('image').annotate(
+            count=Count('pk')
+        ).values_list('image', 'count')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_recipe_tags_tag_recipe_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('references_count', models.PositiveIntegerField(verbose_name='Число рецептов')),
+            ],
+            options={
+                'verbose_name': 'Файл изображения',
+                'verbose_name_plural': 'Файлы изображений',
+            },
+        ),
+        migrations.RunPython(fill_image_blobs, migrations.RunPython.noop),
+    ]
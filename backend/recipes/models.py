@@ -1,6 +1,12 @@
-from django.db import models
+import threading
 
+from django.conf import settings
+from django.db import connections, models, router, transaction
+from django.db.models import Exists, F, OuterRef, Sum
+
+from foodgram.cache import bump_version
 from users.models import User
+from .storage import ContentAddressedStorage
 
 
 class Tag(models.Model):
@@ -45,6 +51,12 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_measurement_unit',
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -77,6 +89,13 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Фотография блюда',
         upload_to='recipes/',
+        storage=ContentAddressedStorage(),
+    )
+    image_variants = models.JSONField(
+        'Уменьшенные копии фотографии',
+        default=dict,
+        blank=True,
+        editable=False,
     )
     text = models.TextField(
         'Описание рецепта'
@@ -86,11 +105,35 @@ class Recipe(models.Model):
         help_text='Время приготовления блюда',
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_favorites_count_idx',
+            ),
+            models.Index(
+                fields=['-in_carts_count', '-id'],
+                name='recipe_in_carts_count_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -127,6 +170,133 @@ class IngredientInRecipesAmount(models.Model):
         ]
 
 
+class ImageBlobManager(models.Manager):
+
+    def acquire(self, name, count=1):
+        connection = connections[router.db_for_write(self.model)]
+        quote_name = connection.ops.quote_name
+        opts = self.model._meta
+        table = quote_name(opts.db_table)
+        references = quote_name(opts.get_field('references_count').column)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({quote_name(opts.pk.column)}, '
+                f'{references}) VALUES (%s, %s) '
+                f'ON CONFLICT ({quote_name(opts.pk.column)}) DO UPDATE '
+                f'SET {references} = {table}.{references} + %s',
+                [name, count, count],
+            )
+
+    def release(self, name):
+        blob = self.select_for_update().filter(name=name).first()
+        if blob is None:
+            return False
+        if blob.references_count > 1:
+            self.filter(name=name).update(
+                references_count=F('references_count') - 1
+            )
+            return False
+        blob.delete()
+        return True
+
+
+class ImageBlob(models.Model):
+    name = models.CharField('Файл', max_length=100, primary_key=True)
+    references_count = models.PositiveIntegerField('Число рецептов')
+
+    objects = ImageBlobManager()
+
+    class Meta:
+        verbose_name = 'Файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+
+    def __str__(self):
+        return self.name
+
+
+def update_counter(model, pks, field, delta):
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    updated = queryset.update(**{field: F(field) + delta})
+    if updated and model is Recipe:
+        bump_version('recipes:counters')
+    return updated
+
+
+class UserRecipeManager(models.Manager):
+
+    def __init__(self, counter_field):
+        super().__init__()
+        self.counter_field = counter_field
+
+    def add(self, user, recipe_ids):
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            added = self.execute(
+                'INSERT INTO {table} ({user}, {recipe}) '
+                'SELECT %s, {recipe_pk} FROM {recipe_table} '
+                'WHERE {recipe_pk} IN ({ids}) '
+                'ON CONFLICT DO NOTHING RETURNING {recipe}',
+                user, recipe_ids,
+            )
+            update_counter(Recipe, added, self.counter_field, 1)
+        return added
+
+    def remove(self, user, recipe_ids):
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            removed = self.execute(
+                'DELETE FROM {table} '
+                'WHERE {user} = %s AND {recipe} IN ({ids}) '
+                'RETURNING {recipe}',
+                user, recipe_ids,
+            )
+            update_counter(Recipe, removed, self.counter_field, -1)
+        return removed
+
+    def execute(self, sql, user, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return []
+        connection = connections[router.db_for_write(self.model)]
+        quote_name = connection.ops.quote_name
+        opts = self.model._meta
+        sql = sql.format(
+            table=quote_name(opts.db_table),
+            user=quote_name(opts.get_field('user').column),
+            recipe=quote_name(opts.get_field('recipe').column),
+            recipe_table=quote_name(Recipe._meta.db_table),
+            recipe_pk=quote_name(Recipe._meta.pk.column),
+            ids=', '.join(['%s'] * len(recipe_ids)),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user.pk, *recipe_ids])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class ShoppingCartManager(UserRecipeManager):
+
+    def add(self, user, recipe_ids):
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            added = super().add(user, recipe_ids)
+            self.refresh_shopping_list(user, added)
+        return added
+
+    def remove(self, user, recipe_ids):
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            removed = super().remove(user, recipe_ids)
+            self.refresh_shopping_list(user, removed)
+        return removed
+
+    def refresh_shopping_list(self, user, recipe_ids):
+        if recipe_ids:
+            ShoppingListIngredient.objects.refresh(
+                [user.pk],
+                IngredientInRecipesAmount.objects.filter(
+                    recipe__in=recipe_ids
+                ).values('ingredient'),
+            )
+
+
 class FavoriteReceipe(models.Model):
     user = models.ForeignKey(
         User,
@@ -142,6 +312,8 @@ class FavoriteReceipe(models.Model):
         verbose_name='Рецепты',
     )
 
+    objects = UserRecipeManager('favorites_count')
+
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Рецепты в избранном'
@@ -168,6 +340,8 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепты',
     )
 
+    objects = ShoppingCartManager('in_carts_count')
+
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
@@ -177,3 +351,144 @@ class ShoppingCart(models.Model):
                 name='recipe_in_shopping_cart',
             )
         ]
+
+
+pending_refreshes = threading.local()
+
+
+class ShoppingListManager(models.Manager):
+
+    def aggregate_amounts(self, user_ids, ingredient_ids=None):
+        amounts = IngredientInRecipesAmount.objects.filter(
+            recipe__shopping_recipes__user__in=user_ids
+        )
+        if ingredient_ids is not None:
+            amounts = amounts.filter(ingredient__in=ingredient_ids)
+        return amounts.values(
+            'ingredient_id', user_id=F('recipe__shopping_recipes__user'),
+        ).annotate(total_amount=Sum('amount')).order_by()
+
+    def refresh(self, user_ids, ingredient_ids=None):
+        using = router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            list(User.objects.using(using).select_for_update().filter(
+                pk__in=user_ids
+            ).order_by('pk').values_list('pk', flat=True))
+            self.upsert(using, list(self.aggregate_amounts(
+                user_ids, ingredient_ids
+            )))
+            stale = self.using(using).filter(user__in=user_ids)
+            if ingredient_ids is not None:
+                stale = stale.filter(ingredient__in=ingredient_ids)
+            stale.exclude(Exists(IngredientInRecipesAmount.objects.filter(
+                ingredient=OuterRef('ingredient'),
+                recipe__shopping_recipes__user=OuterRef('user'),
+            ))).delete()
+
+    def refresh_on_commit(self, user_ids):
+        if not hasattr(pending_refreshes, 'user_ids'):
+            pending_refreshes.user_ids = set()
+        pending_refreshes.user_ids.update(user_ids)
+        transaction.on_commit(
+            self.refresh_pending, using=router.db_for_write(self.model)
+        )
+
+    def refresh_pending(self):
+        user_ids = sorted(getattr(pending_refreshes, 'user_ids', ()))
+        pending_refreshes.user_ids = set()
+        batch_size = settings.SHOPPING_LIST_REFRESH_BATCH_SIZE
+        for start in range(0, len(user_ids), batch_size):
+            self.refresh(user_ids[start:start + batch_size])
+
+    def upsert(self, using, amounts):
+        connection = connections[using]
+        quote_name = connection.ops.quote_name
+        opts = self.model._meta
+        user, ingredient, total_amount = (
+            quote_name(opts.get_field(name).column)
+            for name in ('user', 'ingredient', 'total_amount')
+        )
+        batch_size = connection.ops.bulk_batch_size(
+            ['user', 'ingredient', 'total_amount'], amounts
+        )
+        with connection.cursor() as cursor:
+            for start in range(0, len(amounts), batch_size):
+                batch = amounts[start:start + batch_size]
+                cursor.execute(
+                    f'INSERT INTO {quote_name(opts.db_table)} '
+                    f'({user}, {ingredient}, {total_amount}) VALUES '
+                    + ', '.join(['(%s, %s, %s)'] * len(batch))
+                    + f' ON CONFLICT ({user}, {ingredient}) DO UPDATE '
+                    f'SET {total_amount} = EXCLUDED.{total_amount}',
+                    [
+                        value for amount in batch for value in (
+                            amount['user_id'], amount['ingredient_id'],
+                            amount['total_amount'],
+                        )
+                    ],
+                )
+
+
+class ShoppingListIngredient(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_lists',
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.IntegerField(
+        verbose_name='Количество',
+        help_text='Суммарное количество ингредиента в списке покупок',
+    )
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_ingredient',
+            )
+        ]
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации рецепта',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx',
+            )
+        ]
@@ -0,0 +1,114 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from users.models import Follow, User
+from .feed import backfill, prune, schedule_fan_out
+from .images import release_image, schedule_variants
+from .models import (FavoriteReceipe, ImageBlob, IngredientInRecipesAmount,
+                     Recipe, ShoppingCart, ShoppingListIngredient,
+                     update_counter)
+
+
+def get_ingredient_ids(recipe_id):
+    return list(IngredientInRecipesAmount.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', flat=True))
+
+
+@receiver(post_save, sender=FavoriteReceipe)
+def favorite_added(sender, instance, created, **kwargs):
+    if created:
+        update_counter(Recipe, [instance.recipe_id], 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=FavoriteReceipe)
+def favorite_removed(sender, instance, **kwargs):
+    update_counter(Recipe, [instance.recipe_id], 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    if created:
+        update_counter(Recipe, [instance.recipe_id], 'in_carts_count', 1)
+        ShoppingListIngredient.objects.refresh(
+            [instance.user_id], get_ingredient_ids(instance.recipe_id)
+        )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_removed(sender, instance, **kwargs):
+    update_counter(Recipe, [instance.recipe_id], 'in_carts_count', -1)
+    ShoppingListIngredient.objects.refresh_on_commit([instance.user_id])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    if instance.image and (
+        instance.image.name != instance.image_variants.get('source')
+    ):
+        transaction.on_commit(lambda: schedule_variants(instance.pk))
+
+
+def stored_image_name(instance):
+    image = instance.image
+    if not image or image._committed:
+        return image.name
+    return image.storage.content_name(
+        image.field.generate_filename(instance, image.name), image.file
+    )
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_saving(sender, instance, **kwargs):
+    instance.previous_image = None
+    if not instance._state.adding:
+        instance.previous_image = Recipe.objects.filter(
+            pk=instance.pk
+        ).values('image', 'image_variants').first()
+    name = stored_image_name(instance)
+    previous = instance.previous_image
+    if name and (previous is None or previous['image'] != name):
+        ImageBlob.objects.acquire(name)
+    if name != instance.image_variants.get('source'):
+        instance.image_variants = {}
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_replaced(sender, instance, **kwargs):
+    previous = instance.previous_image
+    if previous and previous['image'] != instance.image.name:
+        transaction.on_commit(lambda: release_image(
+            previous['image'], previous['image_variants'],
+            instance.image.storage,
+        ))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    update_counter(User, [instance.author_id], 'recipes_count', -1)
+    transaction.on_commit(lambda: release_image(
+        instance.image.name, instance.image_variants, instance.image.storage
+    ))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    if created:
+        update_counter(User, [instance.author_id], 'recipes_count', 1)
+        transaction.on_commit(lambda: schedule_fan_out(
+            instance.pk, instance.author_id
+        ))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        update_counter(User, [instance.author_id], 'followers_count', 1)
+        backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    update_counter(User, [instance.author_id], 'followers_count', -1)
+    prune(instance.user_id, instance.author_id)
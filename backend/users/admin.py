@@ -1,14 +1,20 @@
 from django.contrib import admin
 
+from api.pagination import EstimatedCountDjangoPaginator
 from .models import Follow, User
 
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('id', 'username', 'first_name', 'last_name', 'email', )
-    search_fields = ('username', 'email', )
-    list_filter = ('first_name', 'email', )
+    list_display = (
+        'id', 'username', 'first_name', 'last_name', 'email',
+        'recipes_count', 'followers_count',
+    )
+    search_fields = ('email__startswith', 'username__startswith', )
     list_display_links = ('username', )
+    ordering = ('-id', )
+    paginator = EstimatedCountDjangoPaginator
+    show_full_result_count = False
 
 
 @admin.register(Follow)
@@ -16,5 +22,10 @@ class FollowAdmin(admin.ModelAdmin):
     """Админка подписчика."""
 
     list_display = ('user', 'author')
-    list_filter = ('user', 'author')
-    search_fields = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = (
+        'user__email__startswith', 'author__email__startswith',
+    )
+    paginator = EstimatedCountDjangoPaginator
+    show_full_result_count = False
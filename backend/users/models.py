@@ -35,12 +35,32 @@ class User(AbstractUser):
         null=False
     )
 
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков',
+        default=0,
+        editable=False,
+    )
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name',)
 
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'пользователи'
+        indexes = [
+            models.Index(
+                fields=['-followers_count', '-id'],
+                name='user_followers_count_idx'
+            ),
+            models.Index(
+                fields=['-recipes_count', '-id'],
+                name='user_recipes_count_idx'
+            )]
 
     def __str__(self):
         return self.email
@@ -64,9 +84,14 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
-        ordering = ('user',)
+        ordering = ('-id',)
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'],
                 name='unique_follow'
             )]
+        indexes = [
+            models.Index(
+                fields=['user', '-id'],
+                name='follow_user_id_idx'
+            )]